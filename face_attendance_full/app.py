@@ -1,16 +1,51 @@
+import os
+import click
 from flask import Flask, render_template
 from flask_login import LoginManager, login_required, current_user
 from werkzeug.security import generate_password_hash
-from models import db, Teacher, Course
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from models import db, Teacher, Course, missing_tables
 from config import Config
 
+def init_db(app):
+    """Create tables, working directories and the default admin user."""
+    for key in ("DATASET_DIR", "MODEL_DIR"):
+        os.makedirs(app.config[key], exist_ok=True)
+    with app.app_context():
+        db.create_all()
+        if not Teacher.query.filter_by(email="admin@example.com").first():
+            t = Teacher(email="admin@example.com",
+                        password_hash=generate_password_hash("admin123"),
+                        name="Admin")
+            db.session.add(t)
+            db.session.commit()
+
 def create_app():
+    # Keep this cheap: no OpenCV import and no DB access here. Schema/seed is
+    # `flask init-db`; vision resources load on first use or in `flask warm-up`.
     app = Flask(__name__)
     app.config.from_object(Config)
+    os.makedirs(app.instance_path, exist_ok=True)
 
-    # DB
+    # DB (the engine connects lazily)
     db.init_app(app)
 
+    # The schema only changes through `flask init-db`, which also creates tables
+    # added since the database was made (session_summary). Say so instead of a bare 500.
+    @app.errorhandler(OperationalError)
+    @app.errorhandler(ProgrammingError)
+    def schema_error(e):
+        missing = missing_tables(db.engine)
+        if not missing:
+            raise e
+        msg = f"Database schema is out of date: missing table(s) {', '.join(missing)}. Run `flask init-db`."
+        app.logger.error(msg)
+        return msg, 500, {"Content-Type": "text/plain; charset=utf-8"}
+
+    # Vision timing hooks (no-ops unless METRICS_ENABLED)
+    from vision.metrics import configure as configure_metrics
+    configure_metrics(app.config)
+
     # Login manager
     login_manager = LoginManager()
     login_manager.login_view = "auth.login"
@@ -27,19 +62,70 @@ def create_app():
     from blueprints.auth import bp as auth_bp
     from blueprints.courses import bp as courses_bp
     from blueprints.attendance import bp as attendance_bp
+    from blueprints.exports import bp as exports_bp
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(courses_bp, url_prefix="/courses")
     app.register_blueprint(attendance_bp, url_prefix="/attendance")
+    app.register_blueprint(exports_bp, url_prefix="/exports")
 
-    # Seed admin user and tables
-    with app.app_context():
-        db.create_all()
-        if not Teacher.query.filter_by(email="admin@example.com").first():
-            t = Teacher(email="admin@example.com",
-                        password_hash=generate_password_hash("admin123"),
-                        name="Admin")
-            db.session.add(t)
-            db.session.commit()
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create tables (only those missing, so also after an upgrade) and seed the admin user."""
+        init_db(app)
+        click.echo("Database initialized.")
+
+    @app.cli.command("warm-up")
+    def warm_up_command():
+        """Load OpenCV, the Haar cascade and the recognizer; print timings."""
+        from vision.resources import warm_up
+        for k, ms in warm_up(app).items():
+            click.echo(f"{k:12s} {ms:8.1f} ms")
+
+    # Under a pre-forking server (gunicorn --preload) this runs once in the master,
+    # so workers inherit the parsed cascades and models copy-on-write.
+    if app.config.get("VISION_PRELOAD"):
+        from vision.resources import warm_up
+        warm_up(app)
+
+    @app.cli.command("evaluate-threshold")
+    @click.option("--backend", type=click.Choice(["lbph", "embedding"]), default=None, help="default: RECOGNIZER_BACKEND")
+    @click.option("--folds", default=5, show_default=True, help="k-fold splits per person; 0 = leave-one-out")
+    @click.option("--seed", default=0, show_default=True)
+    @click.option("--target-far", default="0.001,0.01,0.05", show_default=True, help="comma-separated target false-accept rates")
+    @click.option("--threshold", type=float, default=None, help="threshold for the confusion table (default: configured)")
+    @click.option("--points", default=50, show_default=True, help="ROC points")
+    @click.option("--out", type=click.Path(dir_okay=False), default=None, help="write JSON here instead of stdout")
+    def evaluate_threshold_command(backend, folds, seed, target_far, threshold, points, out):
+        """Cross-validate the recognizer on dataset/ and recommend thresholds."""
+        import json
+        from vision.evaluate import evaluate
+        report = evaluate(backend, folds, seed, [float(v) for v in target_far.split(",")], threshold, points)
+        for r in report["recommended"]:
+            click.echo(f"FAR <= {r['target_far']:<6} threshold {r['threshold']:<10} (FAR {r['far']}, FRR {r['frr']})", err=True)
+        text = json.dumps(report, indent=2)
+        if out:
+            with open(out, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            click.echo(text)
+
+    @app.cli.command("archive-sessions")
+    @click.option("--older-than-days", type=int, default=None, help="default: ARCHIVE_AFTER_DAYS")
+    @click.option("--vacuum", is_flag=True, help="compact the SQLite database afterwards")
+    def archive_sessions_command(older_than_days, vacuum):
+        """Move closed sessions' attendance into per-term archives, keeping summaries hot."""
+        from archive import archive_sessions
+        missing = missing_tables(db.engine)
+        if missing:
+            raise click.ClickException(f"missing table(s) {', '.join(missing)}; run `flask init-db` first")
+        moved = archive_sessions(older_than_days)
+        for term, n in sorted(moved.items()):
+            click.echo(f"{term:16s} {n:6d} sessions")
+        if not moved:
+            click.echo("Nothing to archive.")
+        if vacuum and db.engine.dialect.name == "sqlite":
+            with db.engine.connect() as con:
+                con.exec_driver_sql("VACUUM")
 
     @app.route("/")
     @login_required
@@ -49,7 +135,9 @@ def create_app():
 
     return app
 
-app = create_app()
-
 if __name__ == "__main__":
+    app = create_app()
+    init_db(app)
+    from vision.resources import warm_up
+    warm_up(app)
     app.run(debug=False, threaded=True)
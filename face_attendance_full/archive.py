@@ -0,0 +1,132 @@
+# archive.py
+# Retention for attendance data. Closed sessions older than ARCHIVE_AFTER_DAYS
+# have their Attendance rows moved into one SQLite file per term
+# (ARCHIVE_DIR/<term>.db). The AttendanceSession row stays hot with a
+# SessionSummary (roster size and counts) next to it, which is all the course
+# chart needs; utils.py reads the archives where it needs the rows themselves.
+import os, sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, Enrollment, Attendance, AttendanceSession, SessionSummary
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    session_id INTEGER NOT NULL,
+    student_id INTEGER NOT NULL,
+    status     TEXT NOT NULL,
+    timestamp  TEXT,
+    PRIMARY KEY (session_id, student_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_attendance_student ON attendance (student_id);
+"""
+
+def term_of(when, terms):
+    """Term key such as '2025-fall' for a datetime; terms maps name -> first month."""
+    name, year = None, when.year
+    for n, month in sorted(terms.items(), key=lambda kv: kv[1]):
+        if when.month >= month:
+            name = n
+    if name is None:   # before the first term of the year: last year's final term
+        name, year = max(terms, key=terms.get), year - 1
+    return f"{year}-{name}"
+
+def _path(directory, term):
+    return os.path.join(directory, f"{term}.db")
+
+def _ts(value):
+    return value.isoformat(sep=" ") if value else None
+
+def _archive_batch(term, sessions):
+    """Copy one term's sessions to its archive and commit there, then replace
+    their hot rows with summaries. Re-running after a crash between the two
+    commits just rewrites the same archive rows."""
+    ids = [s.id for s in sessions]
+    rows = (db.session.query(Attendance.session_id, Attendance.student_id, Attendance.status, Attendance.timestamp)
+            .filter(Attendance.session_id.in_(ids)).all())
+    con = sqlite3.connect(_path(current_app.config["ARCHIVE_DIR"], term))
+    try:
+        with con:
+            con.executescript(SCHEMA)
+            con.executemany("INSERT OR REPLACE INTO attendance VALUES (?, ?, ?, ?)",
+                            [(sid, student_id, status, _ts(ts)) for sid, student_id, status, ts in rows])
+    finally:
+        con.close()
+
+    present = Counter(sid for sid, _, status, _ in rows if status == "present")
+    marked = Counter(sid for sid, _, _, _ in rows)
+    roster = {}
+    for s in sessions:
+        key = (s.course_id, s.section_id)
+        if key not in roster:
+            roster[key] = Enrollment.query.filter_by(course_id=s.course_id, section_id=s.section_id).count()
+        db.session.add(SessionSummary(session_id=s.id, term=term, enrolled=roster[key],
+                                      present=present[s.id], marked=marked[s.id]))
+    Attendance.query.filter(Attendance.session_id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+def archive_sessions(older_than_days=None, now=None, batch=200):
+    """
+    Archive closed sessions started more than older_than_days ago (default
+    ARCHIVE_AFTER_DAYS), `batch` sessions at a time. Returns {term: sessions}.
+    """
+    cfg = current_app.config
+    days = cfg.get("ARCHIVE_AFTER_DAYS", 180) if older_than_days is None else older_than_days
+    cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+    os.makedirs(cfg["ARCHIVE_DIR"], exist_ok=True)
+    moved = {}
+    while True:
+        sessions = (AttendanceSession.query
+                    .outerjoin(SessionSummary, SessionSummary.session_id == AttendanceSession.id)
+                    .filter(AttendanceSession.closed.is_(True), AttendanceSession.started_at < cutoff,
+                            SessionSummary.session_id.is_(None))
+                    .order_by(AttendanceSession.id).limit(batch).all())
+        if not sessions:
+            return moved
+        by_term = {}
+        for s in sessions:
+            by_term.setdefault(term_of(s.started_at, cfg["ARCHIVE_TERMS"]), []).append(s)
+        for term, group in by_term.items():
+            _archive_batch(term, group)
+            moved[term] = moved.get(term, 0) + len(group)
+
+class ArchiveReader:
+    """Read-only connections to the term archives, opened on first use."""
+    def __init__(self, directory):
+        self.directory = directory
+        self._cons = {}
+
+    def _con(self, term):
+        if term not in self._cons:
+            uri = "file:" + _path(self.directory, term) + "?mode=ro"
+            self._cons[term] = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._cons[term]
+
+    def session_rows(self, term, session_id):
+        """[(student_id, status, timestamp)] of one archived session."""
+        cur = self._con(term).execute(
+            "SELECT student_id, status, timestamp FROM attendance WHERE session_id = ?", (session_id,))
+        return [(sid, status, datetime.fromisoformat(ts) if ts else None) for sid, status, ts in cur]
+
+    def student_rows(self, student_id):
+        """[(session_id, status, timestamp)] of one student across every term."""
+        out = []
+        for (term,) in db.session.query(SessionSummary.term).distinct():
+            cur = self._con(term).execute(
+                "SELECT session_id, status, timestamp FROM attendance WHERE student_id = ?", (student_id,))
+            out.extend((sid, status, datetime.fromisoformat(ts) if ts else None) for sid, status, ts in cur)
+        return out
+
+    def close(self):
+        for con in self._cons.values():
+            con.close()
+        self._cons.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def archive_reader():
+    return ArchiveReader(current_app.config["ARCHIVE_DIR"])
@@ -0,0 +1,143 @@
+# asgi.py
+# Async serving mode:  pip install -r requirements-async.txt
+#                      uvicorn asgi:application --host 0.0.0.0 --port 8000
+# The two long-lived endpoints -- the MJPEG video stream and the roster event
+# stream -- are served natively on the event loop: a viewer costs a socket and a
+# coroutine instead of a server thread, and waits on the pipeline's FrameSlot /
+# roster change counter without blocking. Everything else is the regular Flask
+# app, run in asgiref's thread pool. Login comes from the Flask session cookie.
+import re, json, asyncio
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from flask_login import current_user
+from app import create_app
+
+flask_app = create_app()
+flask_app.config["ROSTER_PUSH"] = True   # /events is served below, without a thread per page
+_wsgi = WsgiToAsgi(flask_app)
+
+_VIDEO = re.compile(r"^/attendance/session/(\d+)/video$")
+_EVENTS = re.compile(r"^/attendance/session/(\d+)/events$")
+
+def _context(scope):
+    """Flask request context for an ASGI scope (query string + cookies), to reuse
+    login, config and per-viewer options from the synchronous code."""
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    return flask_app.test_request_context(scope["path"], query_string=scope.get("query_string", b""),
+                                          headers={"Cookie": headers.get("cookie", "")})
+
+def _open_video(scope, session_id):
+    from models import db, AttendanceSession
+    from vision.pipeline import get_pipeline
+    from vision.stream import Viewer
+    with _context(scope):
+        try:
+            if not current_user.is_authenticated:
+                return 401, None, None
+            if AttendanceSession.query.get(session_id) is None:
+                return 404, None, None
+            return 200, get_pipeline(flask_app, session_id), Viewer.from_request(session_id)
+        finally:
+            db.session.remove()
+
+def _open_events(scope, session_id):
+    from models import db, AttendanceSession
+    with _context(scope):
+        try:
+            if not current_user.is_authenticated:
+                return 401, None
+            s = AttendanceSession.query.get(session_id)
+            return (200, (s.id, s.course_id, s.section_id)) if s else (404, None)
+        finally:
+            db.session.remove()
+
+def _roster(ids):
+    from types import SimpleNamespace
+    from models import db
+    from blueprints.attendance import roster_status
+    with flask_app.app_context():
+        try:
+            return roster_status(SimpleNamespace(id=ids[0], course_id=ids[1], section_id=ids[2]))
+        finally:
+            db.session.remove()
+
+async def _error(send, status):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": str(status).encode()})
+
+async def _watch_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def _pump(send, chunks):
+    try:
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        pass   # client went away mid-write
+
+async def _stream(receive, send, content_type, chunks):
+    """Send `chunks` (async iterator of bytes) until it ends or the client leaves.
+    A disconnect cancels the iterator right away, even while it waits for a
+    chunk that may never come (a source that stopped publishing)."""
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", content_type), (b"cache-control", b"no-cache")]})
+    pump = asyncio.create_task(_pump(send, chunks))
+    watcher = asyncio.create_task(_watch_disconnect(receive))
+    try:
+        await asyncio.wait((pump, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        pump.cancel()
+        watcher.cancel()
+        await asyncio.gather(pump, watcher, return_exceptions=True)
+        await chunks.aclose()
+    if not pump.cancelled() and pump.exception() is not None:
+        raise pump.exception()
+
+async def _video(scope, receive, send, session_id):
+    from vision.stream import agen_frames_for_session
+    status, pipeline, viewer = await asyncio.to_thread(_open_video, scope, session_id)
+    if status != 200:
+        return await _error(send, status)
+    camera = parse_qs(scope.get("query_string", b"").decode()).get("cam", [None])[0]
+    await _stream(receive, send, b"multipart/x-mixed-replace; boundary=frame",
+                  agen_frames_for_session(pipeline, viewer, camera))
+
+async def _roster_events(ids):
+    from vision.pipeline import find_pipeline
+    refresh = flask_app.config.get("ROSTER_PUSH_REFRESH_SECONDS", 10)
+    while True:
+        p = find_pipeline(ids[0])
+        changes = p.marker.changes if p else None
+        seq = changes.seq if changes else 0
+        payload = await asyncio.to_thread(_roster, ids)
+        yield f"data: {json.dumps(payload)}\n\n".encode()
+        if changes:
+            await changes.wait_seq_async(seq, refresh)
+        else:
+            await asyncio.sleep(refresh)
+
+async def _events(scope, receive, send, session_id):
+    status, ids = await asyncio.to_thread(_open_events, scope, session_id)
+    if status != 200:
+        return await _error(send, status)
+    await _stream(receive, send, b"text/event-stream", _roster_events(ids))
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] == "http" and scope["method"] == "GET":
+        m = _VIDEO.match(scope["path"])
+        if m:
+            return await _video(scope, receive, send, int(m.group(1)))
+        m = _EVENTS.match(scope["path"])
+        if m:
+            return await _events(scope, receive, send, int(m.group(1)))
+    return await _wsgi(scope, receive, send)
@@ -0,0 +1,408 @@
+# benchmarks/run.py
+# Offline benchmark harness: runs against the shipped dataset/ plus synthetic
+# frames and a seeded throw-away database, and writes machine-readable JSON.
+#
+#   python -m benchmarks.run --out bench.json
+#   python -m benchmarks.run --scale-factor 1.2 --min-neighbors 4 --out tuned.json --compare bench.json
+#   python -m benchmarks.run --only detection,predict
+import os, sys, json, time, argparse, platform, statistics, subprocess, tempfile, shutil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+SECTIONS = ["startup", "detection", "predict", "training", "evaluate", "pipeline", "db"]
+
+def _stats(samples_s):
+    ms = sorted(s * 1000 for s in samples_s)
+    return {
+        "n": len(ms),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min_ms": round(ms[0], 3),
+    }
+
+def _timeit(fn, repeat=20, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return _stats(samples)
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def _augment(images, n, rng):
+    """n training-sized faces derived from the dataset (shift/rotate/brightness/noise)."""
+    import cv2, numpy as np
+    out = []
+    for i in range(n):
+        img = images[i % len(images)]
+        h, w = img.shape
+        m = cv2.getRotationMatrix2D((w / 2, h / 2), float(rng.uniform(-8, 8)), float(rng.uniform(0.95, 1.05)))
+        m[:, 2] += rng.uniform(-6, 6, 2)
+        aug = cv2.warpAffine(img, m, (w, h), borderMode=cv2.BORDER_REPLICATE).astype(np.float32)
+        aug = aug * rng.uniform(0.85, 1.15) + rng.normal(0, 4, aug.shape)
+        out.append(np.ascontiguousarray(np.clip(aug, 0, 255), dtype=np.uint8))
+    return out
+
+# -------------------- SECTIONS --------------------
+
+_STARTUP_PROBE = """
+import sys, time, json, resource
+def peak_mb():
+    # VmHWM is per address space; ru_maxrss survives exec() and would report the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+t0 = time.perf_counter()
+from app import create_app
+app = create_app()
+t1 = time.perf_counter()
+out = {"create_app_ms": (t1 - t0) * 1000, "cv2_imported": "cv2" in sys.modules,
+       "maxrss_mb": peak_mb()}
+if "--warm" in sys.argv:
+    from vision.resources import warm_up
+    warm_up(app)
+    out["warm_up_ms"] = (time.perf_counter() - t1) * 1000
+    out["maxrss_after_warm_up_mb"] = peak_mb()
+print(json.dumps(out))
+"""
+
+def bench_startup(app, args):
+    """Fresh-interpreter import + create_app() (what every CLI call, test and worker pays)."""
+    runs = {"cold": [], "warm": []}
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    for mode in runs:
+        for _ in range(max(3, args.repeat // 4)):
+            argv = [sys.executable, "-c", _STARTUP_PROBE] + (["--warm"] if mode == "warm" else [])
+            runs[mode].append(json.loads(subprocess.check_output(argv, cwd=ROOT, env=env, text=True).strip().splitlines()[-1]))
+    cold, warm = runs["cold"], runs["warm"]
+    return {
+        "create_app": _stats([r["create_app_ms"] / 1000 for r in cold]),
+        "cv2_imported_by_create_app": any(r["cv2_imported"] for r in cold),
+        "maxrss_mb": round(max(r["maxrss_mb"] for r in cold), 1),
+        "warm_up": _stats([r["warm_up_ms"] / 1000 for r in warm]),
+        "maxrss_after_warm_up_mb": round(max(r["maxrss_after_warm_up_mb"] for r in warm), 1),
+    }
+
+def bench_detection(app, args):
+    import cv2
+    from vision.sources import SyntheticSource
+    from vision.resources import haar_cascade_path
+    cascade = cv2.CascadeClassifier(haar_cascade_path(app.config))
+    scale, neighbors = app.config["DETECTION_SCALE_FACTOR"], app.config["DETECTION_MIN_NEIGHBORS"]
+    out = {}
+    for res in args.resolutions:
+        w, h = res
+        src = SyntheticSource(app.config["DATASET_DIR"], size=(w, h), faces=2, seed=1)
+        frames = [src.read()[1] for _ in range(8)]
+        grays = [cv2.equalizeHist(cv2.cvtColor(f, cv2.COLOR_BGR2GRAY)) for f in frames]
+        it = iter(range(10 ** 9))
+        faces_found = []
+        def run():
+            g = grays[next(it) % len(grays)]
+            faces_found.append(len(cascade.detectMultiScale(g, scaleFactor=scale, minNeighbors=neighbors, minSize=(70, 70))))
+        stats = _timeit(run, repeat=args.repeat)
+        stats["mean_faces"] = round(sum(faces_found) / len(faces_found), 2)   # 2 placed per frame
+        out[f"{w}x{h}"] = stats
+    return out
+
+def bench_predict(app, args):
+    import cv2, numpy as np
+    from vision.recognizer import _list_images, _train_with_fallbacks, EmbeddingRecognizer
+    images, _, _ = _list_images(app.config["DATASET_DIR"])
+    rng = np.random.default_rng(0)
+    probes = _augment(images, 32, rng)
+    out = {}
+    for n in args.gallery_sizes:
+        gallery = _augment(images, n, rng)
+        labels = np.arange(n, dtype=np.int32) // 10          # 10 images per synthetic person
+        lbph = cv2.face.LBPHFaceRecognizer_create()
+        _train_with_fallbacks(lbph, gallery, labels)
+        emb = EmbeddingRecognizer.fit(gallery, labels, tuple(app.config["EMBEDDING_INPUT_SIZE"]), app.config["EMBEDDING_DIMS"])
+        it = iter(range(10 ** 9))
+        out[str(n)] = {
+            "persons": int(labels.max()) + 1,
+            "lbph_per_face": _timeit(lambda: lbph.predict(probes[next(it) % len(probes)]), repeat=args.repeat),
+            "embedding_per_face": _timeit(lambda: emb.predict(probes[next(it) % len(probes)]), repeat=args.repeat),
+            "embedding_batch32": _timeit(lambda: emb.predict_batch(probes), repeat=args.repeat),
+        }
+    return out
+
+def bench_training(app, args):
+    from vision.recognizer import train_lbph_model, train_embedding_model, _list_images
+    _, labels, label_map = _list_images(app.config["DATASET_DIR"])
+    return {
+        "persons": len(label_map),
+        "images": int(labels.shape[0]),
+        "train_lbph_model": _timeit(train_lbph_model, repeat=max(3, args.repeat // 5), warmup=1),
+        "train_embedding_model": _timeit(train_embedding_model, repeat=max(3, args.repeat // 5), warmup=1),
+    }
+
+def bench_evaluate(app, args):
+    """All-pairs LBPH distances (vision.evaluate) vs one predict() per probe, on augmented images."""
+    import cv2, numpy as np
+    from vision.recognizer import _list_images, _train_with_fallbacks
+    from vision.evaluate import lbp_counts, chi2_matrix
+    images, _, _ = _list_images(app.config["DATASET_DIR"])
+    rng = np.random.default_rng(0)
+    out = {}
+    for n in args.eval_sizes:
+        gallery = _augment(images, n, rng)
+        labels = np.arange(n, dtype=np.int32) // 10
+        t0 = time.perf_counter()
+        counts, cell_pixels = lbp_counts(gallery)
+        chi2_matrix(counts, cell_pixels=cell_pixels)
+        matrix_s = time.perf_counter() - t0
+        lbph = cv2.face.LBPHFaceRecognizer_create()
+        _train_with_fallbacks(lbph, gallery, labels)
+        sample = min(n, 20)
+        t0 = time.perf_counter()
+        for img in gallery[:sample]:
+            lbph.predict(img)
+        per_probe = (time.perf_counter() - t0) / sample
+        out[str(n)] = {"matrix_s": round(matrix_s, 2), "predict_loop_s (estimated)": round(per_probe * n, 2)}
+    return out
+
+def bench_pipeline(app, args):
+    """Full frame path of a session worker plus one viewer encode, on synthetic frames."""
+    import cv2
+    from vision.sources import SyntheticSource
+    from vision.pipeline import FrameProcessor
+    from vision.recognizer import train_lbph_model, load_lbph_model
+    from vision.stream import _encode
+    from vision.resources import haar_cascade_path
+    train_lbph_model()
+    recog, label_map = load_lbph_model()
+    out = {}
+    for name, (r, lm) in (("detect_only", (None, None)), ("detect_recognize", (recog, label_map))):
+        proc = FrameProcessor(app.config, cv2.CascadeClassifier(haar_cascade_path(app.config)), r, lm)
+        src = SyntheticSource(app.config["DATASET_DIR"], size=(1280, 720), faces=2, seed=2)
+        t0 = time.perf_counter()
+        for _ in range(args.pipeline_frames):
+            ok, frame = src.read()
+            dets = [(x, y, w, h, code or "Unknown", conf) for (x, y, w, h), code, conf in proc.process(frame)]
+            _encode(frame, dets, False, app.config.get("STREAM_MAX_WIDTH"), app.config.get("STREAM_JPEG_QUALITY", 80))
+        elapsed = time.perf_counter() - t0
+        out[name] = {"frames": args.pipeline_frames, "fps": round(args.pipeline_frames / elapsed, 2),
+                     "ms_per_frame": round(elapsed * 1000 / args.pipeline_frames, 3)}
+    return out
+
+def _seed_db(app, args):
+    """Bulk-insert a large school: courses x students, closed sessions with attendance."""
+    import random
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from models import db, Course, Student, Enrollment, AttendanceSession, Attendance
+    rnd = random.Random(0)
+    n_courses, per_course, n_sessions = args.db_courses, args.db_students, args.db_sessions
+    db.session.execute(insert(Course), [{"id": c + 1, "code": f"B{c:03d}", "title": f"Bench {c}"} for c in range(n_courses)])
+    db.session.execute(insert(Student), [{"id": i + 1, "student_code": f"b{i:06d}", "name": f"Student {i}"}
+                                         for i in range(n_courses * per_course)])
+    db.session.execute(insert(Enrollment), [{"student_id": c * per_course + i + 1, "course_id": c + 1, "section_id": None}
+                                            for c in range(n_courses) for i in range(per_course)])
+    start = datetime(2025, 1, 6, 9, 0)
+    sessions, rows, sid = [], [], 0
+    for c in range(n_courses):
+        for k in range(n_sessions):
+            sid += 1
+            when = start + timedelta(days=k)
+            sessions.append({"id": sid, "course_id": c + 1, "section_id": None, "started_at": when, "closed": True})
+            for i in range(per_course):
+                rows.append({"session_id": sid, "student_id": c * per_course + i + 1, "timestamp": when,
+                             "status": "present" if rnd.random() < 0.8 else "absent"})
+    # open sessions with partial attendance for the close benchmark
+    open_ids = []
+    for k in range(args.repeat + 2):
+        sid += 1
+        open_ids.append(sid)
+        sessions.append({"id": sid, "course_id": 1, "section_id": None, "started_at": start, "closed": False})
+        for i in range(0, per_course, 2):
+            rows.append({"session_id": sid, "student_id": i + 1, "timestamp": start, "status": "present"})
+    db.session.execute(insert(AttendanceSession), sessions)
+    for i in range(0, len(rows), 50000):
+        db.session.execute(insert(Attendance), rows[i:i + 50000])
+    db.session.commit()
+    return open_ids, len(rows)
+
+def bench_db(app, args):
+    from models import db
+    with app.app_context():
+        t0 = time.perf_counter()
+        open_ids, n_rows = _seed_db(app, args)
+        seed_s = time.perf_counter() - t0
+    client = app.test_client()
+    client.post("/auth/login", data={"email": "admin@example.com", "password": "admin123"})
+    closed_sid = 1
+    it = iter(open_ids)
+    def check(resp):
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{resp.request.path} -> {resp.status_code}")
+        return resp
+    def export_csv():
+        # whole table, streamed; a second pass under tracemalloc shows whether memory stays flat
+        import tracemalloc
+        def consume():
+            resp = client.get("/exports/attendance.csv", buffered=False)
+            size = sum(len(chunk) for chunk in resp.response)
+            resp.close()
+            return size
+        t0 = time.perf_counter()
+        size = consume()
+        elapsed = time.perf_counter() - t0
+        tracemalloc.start()
+        consume()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"rows": n_rows, "bytes": size, "wall_ms": round(elapsed * 1000, 1),
+                "python_peak_mb": round(peak / 2**20, 2)}
+    def archive():
+        # every closed session but the newest week moves to the term archives
+        from datetime import datetime, timedelta
+        from archive import archive_sessions
+        from models import Attendance
+        with app.app_context():
+            hot = Attendance.query.count()
+            t0 = time.perf_counter()
+            moved = archive_sessions(older_than_days=7, now=datetime(2025, 1, 6) + timedelta(days=args.db_sessions))
+            elapsed = time.perf_counter() - t0
+            left = Attendance.query.count()
+        return {"sessions": sum(moved.values()), "terms": len(moved), "hot_rows_before": hot, "hot_rows_after": left,
+                "wall_s": round(elapsed, 2)}
+    return {
+        "export_csv (all courses)": export_csv(),
+        "seed": {"courses": args.db_courses, "students_per_course": args.db_students,
+                 "sessions_per_course": args.db_sessions, "attendance_rows": n_rows, "seed_s": round(seed_s, 2)},
+        "course_detail (attendance_percentages)": _timeit(lambda: check(client.get("/courses/1")), repeat=args.repeat),
+        "present_json": _timeit(lambda: check(client.get(f"/attendance/present/{closed_sid}.json")), repeat=args.repeat),
+        "close": _timeit(lambda: check(client.post(f"/attendance/session/{next(it)}/close")), repeat=args.repeat, warmup=1),
+        "archive_sessions": archive(),
+        "course_detail (archived)": _timeit(lambda: check(client.get("/courses/1")), repeat=args.repeat),
+        "student_detail (archived)": _timeit(lambda: check(client.get("/courses/student/1")), repeat=args.repeat),
+        "export_csv (course 1, archived)": _timeit(lambda: check(client.get("/exports/attendance.csv?course_id=1")).get_data(),
+                                                   repeat=max(3, args.repeat // 5), warmup=1),
+    }
+
+# -------------------- DRIVER --------------------
+
+def _flatten(d, prefix=""):
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+def compare(current, baseline_path):
+    """Print median/fps changes against an earlier run."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = _flatten(json.load(f)["results"])
+    cur = _flatten(current["results"])
+    print(f"\n{'metric':70s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for key in sorted(cur):
+        if key in base and key.endswith(("median_ms", ".fps")) and base[key]:
+            change = (cur[key] - base[key]) / base[key] * 100
+            print(f"{key:70s} {base[key]:12.3f} {cur[key]:12.3f} {change:+7.1f}%")
+
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Face attendance benchmarks")
+    p.add_argument("--out", help="write JSON results here (default: stdout)")
+    p.add_argument("--compare", help="earlier JSON results to compare against")
+    p.add_argument("--only", default=",".join(SECTIONS), help="comma-separated sections: " + ",".join(SECTIONS))
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--resolutions", default="320x240,640x480,1280x720,1920x1080")
+    p.add_argument("--gallery-sizes", default="100,500,2000")
+    p.add_argument("--eval-sizes", default="300,1000", help="images in the evaluate section")
+    p.add_argument("--pipeline-frames", type=int, default=60)
+    p.add_argument("--db-courses", type=int, default=5)
+    p.add_argument("--db-students", type=int, default=400, help="students per course")
+    p.add_argument("--db-sessions", type=int, default=60, help="closed sessions per course")
+    # config overrides under test
+    p.add_argument("--scale-factor", type=float)
+    p.add_argument("--min-neighbors", type=int)
+    p.add_argument("--image-size", help="CAPTURE_IMAGE_SIZE as WxH")
+    args = p.parse_args(argv)
+    args.resolutions = [tuple(int(v) for v in r.split("x")) for r in args.resolutions.split(",")]
+    args.gallery_sizes = [int(v) for v in args.gallery_sizes.split(",")]
+    args.eval_sizes = [int(v) for v in args.eval_sizes.split(",")]
+    args.only = [s for s in args.only.split(",") if s]
+    return args
+
+def main(argv=None):
+    args = _parse_args(argv)
+    tmp = tempfile.mkdtemp(prefix="face-bench-")
+    # everything the app writes goes to the temp dir; the shipped dataset is read-only input
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    try:
+        import cv2, numpy as np
+        from app import create_app, init_db
+        app = create_app()
+        overrides = {}
+        if args.scale_factor:
+            overrides["DETECTION_SCALE_FACTOR"] = args.scale_factor
+        if args.min_neighbors:
+            overrides["DETECTION_MIN_NEIGHBORS"] = args.min_neighbors
+        if args.image_size:
+            overrides["CAPTURE_IMAGE_SIZE"] = tuple(int(v) for v in args.image_size.split("x"))
+        app.config.update(overrides)
+        app.config.update(
+            MODEL_DIR=tmp, LBPH_MODEL=os.path.join(tmp, "lbph.yml"), LABELS_JSON=os.path.join(tmp, "labels.json"),
+            EMBEDDING_MODEL=os.path.join(tmp, "embedding.npz"), GALLERY_DIR=os.path.join(tmp, "galleries"),
+            CAMERA_PROBE_CACHE=os.path.join(tmp, "camera_probe.json"), ARCHIVE_DIR=os.path.join(tmp, "archive"),
+        )
+        init_db(app)
+
+        results = {}
+        for name in SECTIONS:
+            if name not in args.only:
+                continue
+            print(f"[bench] {name} ...", file=sys.stderr)
+            fn = globals()[f"bench_{name}"]
+            if name == "db":
+                results[name] = fn(app, args)
+            else:
+                with app.app_context():
+                    results[name] = fn(app, args)
+
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "git_rev": _git_rev(),
+                "python": platform.python_version(),
+                "opencv": cv2.__version__,
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "config": {k: app.config[k] for k in ("DETECTION_SCALE_FACTOR", "DETECTION_MIN_NEIGHBORS",
+                                                      "CAPTURE_IMAGE_SIZE", "EMBEDDING_INPUT_SIZE", "EMBEDDING_DIMS")},
+                "overrides": overrides,
+                "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            },
+            "results": results,
+        }
+        text = json.dumps(report, indent=2, default=list)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"[bench] wrote {args.out}", file=sys.stderr)
+        else:
+            print(text)
+        if args.compare:
+            compare(report, args.compare)
+        return report
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
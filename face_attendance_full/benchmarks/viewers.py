@@ -0,0 +1,124 @@
+# benchmarks/viewers.py
+# Concurrent MJPEG viewers against a RUNNING server (threaded Flask or asgi.py).
+# Opens N streaming connections to one session's /video, counts the frames each
+# receives, and reports per-viewer frame rate, failures and (with --pid) the
+# server process's thread count and RSS. Start a session in the UI first.
+#
+#   python app.py                                  # or: uvicorn asgi:application --port 5000
+#   python -m benchmarks.viewers --url http://127.0.0.1:5000 --session 1 --viewers 10,50,100,200 --pid <server pid>
+import sys, json, time, asyncio, argparse, statistics
+from http.cookiejar import CookieJar
+from urllib.parse import urlsplit, urlencode
+from urllib.request import build_opener, HTTPCookieProcessor
+
+BOUNDARY = b"--frame\r\n"
+
+def _login(base, email, password):
+    jar = CookieJar()
+    opener = build_opener(HTTPCookieProcessor(jar))
+    opener.open(base + "/auth/login", data=urlencode({"email": email, "password": password}).encode(), timeout=10)
+    cookie = "; ".join(f"{c.name}={c.value}" for c in jar)
+    if "session=" not in cookie:
+        raise SystemExit("login failed (no session cookie)")
+    return cookie
+
+def _proc(pid):
+    """Threads and RSS (MB) of the server process, from /proc."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    out["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    out["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+async def _viewer(host, port, path, cookie, duration, ready):
+    """Frames received over `duration` seconds once all viewers are connected."""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 10)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), 10)
+        if b" 200 " not in status:
+            writer.close()
+            return {"error": status.decode(errors="replace").strip()}
+    except (OSError, asyncio.TimeoutError) as e:
+        return {"error": type(e).__name__}
+    await ready.wait()
+    frames, buf, tail = 0, b"", len(BOUNDARY) - 1
+    end = time.monotonic() + duration
+    try:
+        while (left := end - time.monotonic()) > 0:
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), left)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            buf = buf[-tail:] + chunk
+            frames += buf.count(BOUNDARY)
+    finally:
+        writer.close()
+    return {"frames": frames}
+
+async def _round(args, cookie, n):
+    u = urlsplit(args.url)
+    path = f"/attendance/session/{args.session}/video?" + urlencode({"cam": args.cam} if args.cam else {}) + args.query
+    ready = asyncio.Event()
+    tasks = [asyncio.create_task(_viewer(u.hostname, u.port or 80, path, cookie, args.duration, ready)) for _ in range(n)]
+    await asyncio.sleep(args.connect_wait)   # let every connection get its response headers
+    before = _proc(args.pid) if args.pid else {}
+    ready.set()
+    await asyncio.sleep(args.duration / 2)
+    during = _proc(args.pid) if args.pid else {}
+    results = await asyncio.gather(*tasks)
+    fps = sorted(r["frames"] / args.duration for r in results if "frames" in r)
+    errors = [r["error"] for r in results if "error" in r]
+    return {
+        "viewers": n,
+        "connected": len(fps),
+        "failed": len(errors),
+        "errors": sorted(set(errors)),
+        "fps_median": round(statistics.median(fps), 2) if fps else 0.0,
+        "fps_min": round(fps[0], 2) if fps else 0.0,
+        "fps_p10": round(fps[int(len(fps) * 0.1)], 2) if fps else 0.0,
+        "server": {"connected": before, "streaming": during},
+    }
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Concurrent MJPEG viewer load test")
+    p.add_argument("--url", default="http://127.0.0.1:5000")
+    p.add_argument("--session", type=int, required=True)
+    p.add_argument("--cam", default=None)
+    p.add_argument("--query", default="", help="extra query string, e.g. '&preview=1'")
+    p.add_argument("--viewers", default="10,50,100", help="comma-separated viewer counts, one round each")
+    p.add_argument("--duration", type=float, default=10.0, help="seconds measured per round")
+    p.add_argument("--connect-wait", type=float, default=3.0)
+    p.add_argument("--pid", type=int, default=None, help="server pid, for thread/RSS readings (Linux)")
+    p.add_argument("--email", default="admin@example.com")
+    p.add_argument("--password", default="admin123")
+    p.add_argument("--out", default=None)
+    args = p.parse_args(argv)
+
+    cookie = _login(args.url, args.email, args.password)
+    rounds = []
+    for n in (int(v) for v in args.viewers.split(",")):
+        print(f"[viewers] {n} ...", file=sys.stderr)
+        rounds.append(asyncio.run(_round(args, cookie, n)))
+        time.sleep(2)   # let the server drop the previous round's connections
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "url": args.url, "session": args.session,
+                       "duration_s": args.duration, "query": args.query},
+              "rounds": rounds}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,53 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response, current_app, stream_with_context
 from flask_login import login_required
-from models import db, Course, Section, Student, Enrollment, Attendance, AttendanceSession
-from vision.stream import gen_frames_for_session, camera_diagnostics
+from models import db, Course, Section, Student, Enrollment, Attendance, AttendanceSession, SessionSummary
+# vision imports (OpenCV) are deferred to the views that use them
 
 bp = Blueprint("attendance", __name__, template_folder="../templates")
 
 @bp.route("/start", methods=["GET", "POST"])
 @login_required
 def start():
+    from vision.pipeline import camera_sources, set_session_sources
     if request.method == "GET":
         courses = Course.query.all()
-        return render_template("start_session.html", courses=courses)
+        return render_template("start_session.html", courses=courses, cameras=camera_sources(current_app))
     course_id = int(request.form.get("course_id"))
     section_id = request.form.get("section_id")
     section_id = int(section_id) if section_id else None
     s = AttendanceSession(course_id=course_id, section_id=section_id, closed=False)
     db.session.add(s)
     db.session.commit()
+    cameras = request.form.getlist("cameras")
+    if cameras:
+        set_session_sources(s.id, cameras)
     return redirect(url_for("attendance.session", session_id=s.id))
 
 @bp.route("/session/<int:session_id>")
 @login_required
 def session(session_id):
+    from vision.pipeline import session_sources
     s = AttendanceSession.query.get_or_404(session_id)
     course = Course.query.get_or_404(s.course_id)
     section = Section.query.get(s.section_id) if s.section_id else None
-    return render_template("attendance_session.html", session=s, course=course, section=section)
+    return render_template("attendance_session.html", session=s, course=course, section=section,
+                           cameras=list(session_sources(current_app, session_id)))
 
 @bp.route("/session/<int:session_id>/video")
 @login_required
 def video(session_id):
-    return Response(gen_frames_for_session(session_id),
+    from vision.stream import gen_frames_for_session
+    AttendanceSession.query.get_or_404(session_id)
+    return Response(stream_with_context(gen_frames_for_session(session_id, camera=request.args.get("cam"))),
                     mimetype="multipart/x-mixed-replace; boundary=frame")
 
 @bp.route("/session/<int:session_id>/manual", methods=["GET", "POST"])
 @login_required
 def manual(session_id):
     s = AttendanceSession.query.get_or_404(session_id)
+    if s.closed or SessionSummary.query.get(session_id):
+        flash("This session is closed; its attendance can no longer be edited.", "warning")
+        return redirect(url_for("attendance.session", session_id=session_id))
     # students in this course (and section if set)
     q = Enrollment.query.filter_by(course_id=s.course_id)
     if s.section_id:
@@ -101,6 +112,8 @@ def close(session_id):
 
     s.closed = True
     db.session.commit()
+    from vision.pipeline import stop_pipeline
+    stop_pipeline(session_id)
 
     flash("Session closed. Absent marked for all remaining students.", "success")
     return redirect(url_for("attendance.session", session_id=session_id))
@@ -109,18 +122,46 @@ def close(session_id):
 @bp.route("/present/<int:session_id>.json", methods=["GET"])
 @login_required
 def present_json(session_id):
-    s = AttendanceSession.query.get_or_404(session_id)
+    return roster_status(AttendanceSession.query.get_or_404(session_id))
+
+def roster_status(s):
+    """Present / remaining display names for a session's roster."""
     q = Enrollment.query.filter_by(course_id=s.course_id)
     if s.section_id:
         q = q.filter_by(section_id=s.section_id)
     enrolled_ids = [e.student_id for e in q.all()]
     students = Student.query.filter(Student.id.in_(enrolled_ids)).all()
-    present_ids = {a.student_id for a in Attendance.query.filter_by(session_id=session_id, status="present")}
+    summary = SessionSummary.query.get(s.id)
+    if summary:
+        from archive import archive_reader
+        with archive_reader() as reader:
+            present_ids = {sid for sid, status, _ in reader.session_rows(summary.term, s.id) if status == "present"}
+    else:
+        present_ids = {a.student_id for a in Attendance.query.filter_by(session_id=s.id, status="present")}
     present_names = [f"{st.name} ({st.student_code})" for st in students if st.id in present_ids]
     remaining_names = [f"{st.name} ({st.student_code})" for st in students if st.id not in present_ids]
     return {"present_names": present_names, "remaining_names": remaining_names}
 
+@bp.route("/pipelines.json", methods=["GET"])
+@login_required
+def pipelines_json():
+    """Running session pipelines (viewers, per-camera frame and detection counts) and shared vision resources."""
+    from vision.pipeline import pipelines_stats
+    from vision.resources import stats as resource_stats
+    return {"pipelines": pipelines_stats(), "resources": resource_stats()}
+
 @bp.route("/camera-diag", methods=["GET"])
 @login_required
 def camera_diag():
+    from vision.camera import camera_diagnostics
     return camera_diagnostics()
+
+@bp.route("/camera-probe", methods=["GET"])
+@login_required
+def camera_probe():
+    """
+    Probe timings per (backend, index/url) combination and the cached winner.
+    Visit: /attendance/camera-probe  (add ?run=1 to re-probe every combination in the background)
+    """
+    from vision.camera import probe_report
+    return probe_report(run=request.args.get("run") in ("1", "true", "yes"))
@@ -1,9 +1,8 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, abort
 from flask_login import login_required
 from models import db, Course, Section, Student, Enrollment
 from utils import attendance_percentages, student_attendance_overview
-from vision.recognizer import train_lbph_model
-from vision.dataset import save_uploaded_images, capture_guided_three
+# vision imports (OpenCV) are deferred to the views that use them
 
 # Define the blueprint FIRST
 bp = Blueprint("courses", __name__, template_folder="../templates")
@@ -184,22 +183,60 @@ def student_detail(student_id):
     overview = student_attendance_overview(student_id)
     return render_template("student_detail.html", student=student, overview=overview)
 
-@bp.route("/students/<int:student_id>/capture", methods=["GET", "POST"])
+@bp.route("/students/<int:student_id>/capture", methods=["GET"])
 @login_required
 def capture_faces(student_id):
     student = Student.query.get_or_404(student_id)
-    if request.method == "POST":
-        saved = capture_guided_three(student.student_code)
-        if saved:
-            flash(f"Captured {saved} images for {student.name}.", "success")
-        else:
-            flash("No face captured. Try again with better lighting.", "warning")
-        return redirect(url_for("courses.student_detail", student_id=student_id))
-    return render_template("capture_faces.html")
+    return render_template("capture_faces.html", student=student)
+
+@bp.route("/students/<int:student_id>/capture/start", methods=["POST"])
+@login_required
+def capture_start(student_id):
+    """
+    Open a guided capture session. source=browser (default): the page posts frames;
+    source=server: a background thread feeds frames from the server camera.
+    """
+    from vision.capture import start_capture, feed_from_server_camera
+    student = Student.query.get_or_404(student_id)
+    cap = start_capture(current_app._get_current_object(), student.student_code)
+    if request.values.get("source") == "server":
+        feed_from_server_camera(current_app._get_current_object(), cap)
+    return cap.status(), 201
+
+def _capture_or_404(capture_id):
+    from vision.capture import get_capture
+    cap = get_capture(capture_id)
+    if cap is None:
+        abort(404)
+    return cap
+
+@bp.route("/capture/<capture_id>/frame", methods=["POST"])
+@login_required
+def capture_frame(capture_id):
+    cap = _capture_or_404(capture_id)
+    f = request.files.get("frame")
+    data = f.read() if f else request.get_data()
+    if not data:
+        return {"ok": False, "error": "empty frame"}, 400
+    accepted = cap.submit(data)
+    return dict(cap.status(), accepted=accepted), 202
+
+@bp.route("/capture/<capture_id>/status", methods=["GET"])
+@login_required
+def capture_status(capture_id):
+    return _capture_or_404(capture_id).status()
+
+@bp.route("/capture/<capture_id>/cancel", methods=["POST"])
+@login_required
+def capture_cancel(capture_id):
+    cap = _capture_or_404(capture_id)
+    cap.cancel()
+    return cap.status()
 
 @bp.route("/<int:course_id>/students/<int:student_id>/upload", methods=["POST"])
 @login_required
 def upload_student_photos(course_id, student_id):
+    from vision.dataset import save_uploaded_images
     student = Student.query.get_or_404(student_id)
     files = request.files.getlist("photos")
     saved, skipped = save_uploaded_images(student.student_code, files)
@@ -212,8 +249,9 @@ def upload_student_photos(course_id, student_id):
 @bp.route("/train-model", methods=["POST"])
 @login_required
 def train_model():
+    from vision.recognizer import train_recognizer
     try:
-        train_lbph_model()
+        train_recognizer()
         flash("Model trained successfully.", "success")
     except Exception as e:
         flash(f"Training failed: {e}", "danger")
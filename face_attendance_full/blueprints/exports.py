@@ -0,0 +1,114 @@
+import io, csv, tempfile, importlib
+from datetime import datetime, timedelta
+from flask import Blueprint, request, Response, current_app, stream_with_context
+from flask_login import login_required
+from models import Course
+from utils import EXPORT_COLUMNS, attendance_export_rows
+
+bp = Blueprint("exports", __name__)
+
+FORMATS = {
+    "csv":     "text/csv; charset=utf-8",
+    "xlsx":    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+OPTIONAL = {"xlsx": "openpyxl", "parquet": "pyarrow"}   # formats that need an extra package
+
+def _cells(row):
+    return [v.isoformat(sep=" ", timespec="seconds") if isinstance(v, datetime) else v for v in row]
+
+def _csv_chunks(rows, chunk_size):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(_cells(row))
+        if i % chunk_size == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+def _write_xlsx(rows, f):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)     # rows go straight to disk
+    ws = wb.create_sheet("attendance")
+    ws.append(EXPORT_COLUMNS)
+    for row in rows:
+        ws.append(list(row))
+    wb.save(f)
+
+def _write_parquet(rows, f, chunk_size):
+    import pyarrow as pa, pyarrow.parquet as pq
+    schema = pa.schema([("course_code", pa.string()), ("course_title", pa.string()), ("section", pa.string()),
+                        ("session_id", pa.int64()), ("session_started_at", pa.timestamp("s")),
+                        ("student_code", pa.string()), ("student_name", pa.string()), ("status", pa.string()),
+                        ("marked_at", pa.timestamp("s"))])
+    def flush(batch):
+        columns = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+
+    with pq.ParquetWriter(f, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+def _file_chunks(write):
+    """XLSX/Parquet need their footer before they can be read: build the file on
+    disk (one chunk of rows in memory at a time), then stream it out."""
+    with tempfile.TemporaryFile() as f:
+        write(f)
+        f.seek(0)
+        while True:
+            data = f.read(64 * 1024)
+            if not data:
+                return
+            yield data
+
+def _date(name):
+    value = request.args.get(name)
+    return datetime.strptime(value, "%Y-%m-%d") if value else None
+
+@bp.route("/attendance.<fmt>", methods=["GET"])
+@login_required
+def attendance(fmt):
+    """
+    Attendance rows for ?course_id=&section_id=&from=YYYY-MM-DD&to=YYYY-MM-DD
+    (all optional; `to` is inclusive, dates are session start dates) as CSV,
+    XLSX (needs openpyxl) or Parquet (needs pyarrow), streamed.
+    """
+    if fmt not in FORMATS:
+        return {"error": f"unknown format {fmt!r}; use one of {sorted(FORMATS)}"}, 404
+    try:
+        course_id = request.args.get("course_id", type=int)
+        section_id = request.args.get("section_id", type=int)
+        since, until = _date("from"), _date("to")
+    except ValueError:
+        return {"error": "dates must be YYYY-MM-DD"}, 400
+    if until:
+        until += timedelta(days=1)
+    if fmt in OPTIONAL:
+        try:
+            importlib.import_module(OPTIONAL[fmt])
+        except ImportError:
+            return {"error": f"{fmt} export needs {OPTIONAL[fmt]} installed; use csv"}, 501
+
+    course = Course.query.get_or_404(course_id) if course_id else None
+    chunk_size = current_app.config.get("EXPORT_CHUNK_SIZE", 1000)
+    rows = attendance_export_rows(course_id, section_id, since, until, chunk_size)
+    if fmt == "csv":
+        body = _csv_chunks(rows, chunk_size)
+    elif fmt == "xlsx":
+        body = _file_chunks(lambda f: _write_xlsx(rows, f))
+    else:
+        body = _file_chunks(lambda f: _write_parquet(rows, f, chunk_size))
+
+    name = "_".join(filter(None, ["attendance", course.code if course else "all",
+                                  request.args.get("from"), request.args.get("to")]))
+    return Response(stream_with_context(body), mimetype=FORMATS[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'})
@@ -1,5 +1,4 @@
 import os
-import cv2
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -13,30 +12,72 @@ class Config:
 
     DATASET_DIR = os.path.join(BASE_DIR, "dataset")
     MODEL_DIR   = os.path.join(BASE_DIR, "models")
-    HAAR_CASCADE = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    HAAR_CASCADE = None              # None = OpenCV's bundled haarcascade_frontalface_default.xml
+    CASCADE_POOL_PRELOAD = 2         # cascades parsed up front by warm-up (more are created on demand)
+    RECOGNIZER_POOL_SIZE = 4         # LBPH copies per model, so that many threads can predict at once
+    VISION_PRELOAD = os.environ.get("VISION_PRELOAD", "0") in ("1", "true", "yes")  # warm up inside create_app()
     LBPH_MODEL   = os.path.join(MODEL_DIR, "lbph.yml")
     LABELS_JSON  = os.path.join(MODEL_DIR, "labels.json")
+    GALLERY_DIR  = os.path.join(MODEL_DIR, "galleries")
+    EMBEDDING_MODEL = os.path.join(MODEL_DIR, "embedding.npz")
 
     # Camera config
-    CAMERA_SOURCE   = 0              # try 0, then 1 if you have external webcam
-    CAMERA_BACKENDS = [cv2.CAP_MSMF, cv2.CAP_DSHOW, cv2.CAP_ANY]
+    # Camera index (try 0, then 1 if you have external webcam), an rtsp/http URL,
+    # "file:clip.mp4?fps=max" to replay a recording or "synthetic:?faces=2" for
+    # camera-less runs (see vision/sources.py)
+    CAMERA_SOURCE   = os.environ.get("CAMERA_SOURCE", 0)
+    CAMERA_BACKENDS = ["MSMF", "DSHOW", "ANY"]   # cv2.CAP_* names (or ints), resolved when the camera is opened
     CAMERA_INDICES  = [0, 1, 2, 3]
+    CAMERA_RESOLUTION = (1280, 720)
+    CAMERA_PROBE_CACHE = os.path.join(BASE_DIR, "instance", "camera_probe.json")  # last working combination
+    CAMERA_RETRY_SECONDS = 5         # stream re-opens the camera this often while unavailable
+    # Several cameras per session, e.g. {"front": 0, "door": "rtsp://10.0.0.5/stream"};
+    # empty means a single camera from CAMERA_SOURCE
+    CAMERA_SOURCES = {}
+    DETECTION_MAX_FPS = 12           # detections/second shared round-robin by a session's cameras (None = no cap)
+    PIPELINE_IDLE_SECONDS = 30       # stop a session's camera workers this long after the last viewer leaves
+
+    # MJPEG viewers (each viewer may lower these with ?quality=&width=&fps=)
+    STREAM_JPEG_QUALITY = 80
+    STREAM_MAX_WIDTH = None          # downscale before encoding, e.g. 960; None = camera resolution
+    STREAM_MAX_FPS = 15              # per-viewer frame-rate cap
+    STREAM_PREVIEW = {"width": 320, "quality": 60, "fps": 5}   # ?preview=1 (thumbnails)
+    STREAM_CHANGE_THRESHOLD = 2.0    # mean abs diff (0-255) on a 32x18 thumbnail below which a frame counts as unchanged
+    STREAM_KEEPALIVE_SECONDS = 2.0   # resend an unchanged frame at least this often
+    ROSTER_PUSH = False              # roster events (SSE) instead of polling; asgi.py turns it on, app.run would hold a thread per page
+    ROSTER_PUSH_REFRESH_SECONDS = 10 # roster events are resent at least this often (manual marks)
+    EXPORT_CHUNK_SIZE = 1000         # rows fetched per server-side cursor batch / written per chunk
+
+    # Retention: `flask archive-sessions` moves closed sessions older than this into
+    # one SQLite file per term under ARCHIVE_DIR (see archive.py)
+    ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join(BASE_DIR, "instance", "archive"))
+    ARCHIVE_AFTER_DAYS = 180
+    ARCHIVE_TERMS = {"spring": 1, "fall": 8}   # term name -> first month
+
+    # Hot-path timing (read/preprocess/detect/predict/mark/encode) -> /api/metrics, ?debug=1 overlay
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") in ("1", "true", "yes")
+    METRICS_WINDOW = 256             # samples per (session, stage) used for percentiles
 
 
     # Detection/recognition
     DETECTION_SCALE_FACTOR = 1.1
     DETECTION_MIN_NEIGHBORS = 6
+    RECOGNIZER_BACKEND = "lbph"             # "lbph" or "embedding" (PCA+LDA, cosine index)
     RECOGNITION_CONFIDENCE_THRESHOLD = 95   # LBPH distance; lower is better
+    EMBEDDING_DISTANCE_THRESHOLD = 0.35     # embedding cosine distance (0..2); lower is better
+    EMBEDDING_INPUT_SIZE = (64, 64)         # faces are downsampled to this before projection
+    EMBEDDING_DIMS = 32                     # upper bound; LDA gives at most (people - 1)
     RECOGNITION_COOLDOWN_SECONDS = 8
+    # "session": match only against the students enrolled in the session's course/section
+    # (per-roster models cached in GALLERY_DIR); "global": the whole-school lbph.yml
+    RECOGNITION_SCOPE = "session"
     CAPTURE_IMAGE_SIZE = (200, 200)
 
     # Capture / uploads
-    CAPTURE_SHOW_WINDOW = True
+    CAPTURE_SESSION_TIMEOUT_SECONDS = 60   # guided capture gives up after this
+    CAPTURE_STEP_PAUSE_SECONDS = 1.0       # time to turn the head between prompts
+    CAPTURE_FRAME_INTERVAL_SECONDS = 0.25  # server-camera feed rate for guided capture
     AUTO_TRAIN_AFTER_CAPTURE = False  # you can turn this on
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg"}
-
-os.makedirs(os.path.join(BASE_DIR, "instance"), exist_ok=True)
-os.makedirs(os.path.join(BASE_DIR, "models"), exist_ok=True)
-os.makedirs(os.path.join(BASE_DIR, "dataset"), exist_ok=True)
@@ -51,3 +51,18 @@ class Attendance(db.Model):
     status = db.Column(db.String(16), default="present")
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     __table_args__ = (db.UniqueConstraint("session_id", "student_id", name="uq_attendance"),)
+
+class SessionSummary(db.Model):
+    # Counts kept hot for a session whose Attendance rows moved to a term archive (archive.py)
+    session_id = db.Column(db.Integer, db.ForeignKey("attendance_session.id"), primary_key=True)
+    term = db.Column(db.String(32), nullable=False, index=True)
+    enrolled = db.Column(db.Integer, nullable=False, default=0)   # roster size when archived
+    present = db.Column(db.Integer, nullable=False, default=0)
+    marked = db.Column(db.Integer, nullable=False, default=0)     # attendance rows (present + absent)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def missing_tables(engine):
+    """Names of model tables the database doesn't have yet (`flask init-db` creates them)."""
+    from sqlalchemy import inspect
+    existing = set(inspect(engine).get_table_names())
+    return [t.name for t in db.metadata.sorted_tables if t.name not in existing]
@@ -4,10 +4,7 @@ import io, time, uuid
 from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional
 from flask import Blueprint, request, jsonify, Response, current_app
-try:
-    import cv2
-except Exception:
-    cv2 = None
+from flask_login import login_required
 
 routes = Blueprint("routes", __name__)
 
@@ -46,3 +43,33 @@ def dev_seed():
     ses = Session(id="ses_"+uuid.uuid4().hex[:8], title="Demo Session", course_code="CS101")
     DB["sessions"][ses.id] = ses
     return _cors({"ok": True, "session_id": ses.id, "student_ids": [s1.id, s2.id]})
+
+@routes.route("/embeddings", methods=["GET"])
+@login_required
+def embeddings():
+    """Per-student embedding (class centroid) from the embedding recognizer.
+    Biometric data: login only, no CORS, and nothing is stored in DB."""
+    from models import Student as StudentRow
+    from vision.recognizer import load_embedding_model
+    recognizer, label_map = load_embedding_model()
+    if recognizer is None:
+        return {"ok": False, "error": "embedding model not trained (RECOGNIZER_BACKEND='embedding')"}, 404
+    names = {st.student_code: st.name for st in StudentRow.query.filter(StudentRow.student_code.in_(label_map.values()))}
+    out = []
+    for label, vec in recognizer.centroids().items():
+        code = label_map.get(label)
+        st = Student(id="stu_"+code, name=names.get(code, code), roll=code,
+                     embedding=[round(float(v), 6) for v in vec], meta={"label": label})
+        out.append(asdict(st))
+    return {"ok": True, "dims": int(recognizer.projection.shape[1]), "students": out}
+
+@routes.route("/metrics", methods=["GET"])
+@login_required
+def metrics_endpoint():
+    """Vision hot-path timings per session and stage (METRICS_ENABLED).
+    JSON by default; ?format=prometheus for the Prometheus text format."""
+    from vision import metrics
+    if request.args.get("format") == "prometheus" or "text/plain" in request.headers.get("Accept", ""):
+        return Response(metrics.prometheus_text(), mimetype="text/plain; version=0.0.4")
+    return {"ok": True, "enabled": metrics.enabled(), "stages": list(metrics.STAGES),
+            "sessions": metrics.snapshot()}
@@ -0,0 +1,108 @@
+# tests/test_archive.py
+# Archive -> view -> export: an archived session must stay read-only and its
+# rows must come from the term archive only.
+#   python -m pytest -q tests
+import os, sys
+from datetime import datetime
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'app.db'}")
+    from app import create_app, init_db
+    app = create_app()
+    app.config.update(
+        ARCHIVE_DIR=str(tmp_path / "archive"), MODEL_DIR=str(tmp_path), GALLERY_DIR=str(tmp_path / "galleries"),
+        LBPH_MODEL=str(tmp_path / "lbph.yml"), LABELS_JSON=str(tmp_path / "labels.json"),
+        EMBEDDING_MODEL=str(tmp_path / "embedding.npz"), CAMERA_PROBE_CACHE=str(tmp_path / "camera_probe.json"),
+        CAMERA_SOURCE="synthetic:?faces=2&fps=30", CAMERA_SOURCES={},
+    )
+    init_db(app)
+    from models import db, Course, Student, Enrollment, AttendanceSession, Attendance
+    with app.app_context():
+        db.session.add(Course(id=1, code="C1", title="Course"))
+        for i in range(1, 4):
+            db.session.add(Student(id=i, student_code=f"t{i}", name=f"Student {i}"))
+            db.session.add(Enrollment(student_id=i, course_id=1))
+        db.session.add(AttendanceSession(id=1, course_id=1, started_at=datetime(2025, 1, 10, 9), closed=True))
+        for i in range(1, 4):
+            db.session.add(Attendance(session_id=1, student_id=i, status="present" if i == 1 else "absent",
+                                      timestamp=datetime(2025, 1, 10, 9, i)))
+        db.session.commit()
+    yield app
+    from vision.pipeline import stop_pipeline
+    stop_pipeline(1)
+
+def _login(app):
+    client = app.test_client()
+    client.post("/auth/login", data={"email": "admin@example.com", "password": "admin123"})
+    return client
+
+def test_archive_view_export(app):
+    from archive import archive_sessions
+    from models import db, Attendance, AttendanceSession, SessionSummary
+    from vision.pipeline import AttendanceMarker, find_pipeline
+    client = _login(app)
+    before = client.get("/exports/attendance.csv?course_id=1").get_data(as_text=True)
+    assert len(before.splitlines()) == 4
+    # closed, not yet archived: manual attendance is refused too
+    assert client.post("/attendance/session/1/manual", data={"present": ["2"]}).status_code == 302
+    assert client.get("/exports/attendance.csv?course_id=1").get_data(as_text=True) == before
+
+    with app.app_context():
+        assert archive_sessions(older_than_days=30, now=datetime(2025, 6, 1)) == {"2025-spring": 1}
+        assert Attendance.query.count() == 0
+        assert SessionSummary.query.get(1).present == 1
+
+    # viewing the archived session starts its cameras, but never marks anyone
+    resp = client.get("/attendance/session/1/video", buffered=False)
+    assert next(iter(resp.response)).startswith(b"--frame")
+    resp.close()
+    assert find_pipeline(1).marker.read_only
+    with app.app_context():
+        marker = AttendanceMarker(1, 1, None, cooldown=0)
+        assert marker.mark(2) is False
+        assert Attendance.query.count() == 0
+        # a stray hot row (e.g. written by an older version) must not duplicate the archived one
+        db.session.add(Attendance(session_id=1, student_id=2, status="present"))
+        db.session.commit()
+
+    # ... and once archived
+    resp = client.post("/attendance/session/1/manual", data={"present": ["2"]})
+    assert resp.status_code == 302 and resp.headers["Location"].endswith("/attendance/session/1")
+    assert client.get("/exports/attendance.csv?course_id=1").get_data(as_text=True) == before
+    assert client.get("/attendance/present/1.json").get_json()["present_names"] == ["Student 1 (t1)"]
+    history = client.get("/courses/student/2")
+    assert history.status_code == 200 and history.get_data(as_text=True).count("absent</span>") == 1
+    # rows without a timestamp (hot or archived) sort last instead of breaking the history
+    with app.app_context():
+        db.session.add(AttendanceSession(id=2, course_id=1, started_at=datetime(2025, 2, 1, 9)))
+        db.session.add(Attendance(session_id=2, student_id=2, status="present"))
+        db.session.commit()
+        Attendance.query.filter_by(session_id=2).update({"timestamp": None})
+        db.session.commit()
+        from utils import student_attendance_overview
+        overview = student_attendance_overview(2)
+    assert [r["session_id"] for r in overview] == [1, 2] and overview[-1]["time"] is None
+    assert client.get("/courses/student/2").status_code == 200
+
+def test_missing_summary_table_needs_init_db(app, tmp_path):
+    import sqlite3
+    con = sqlite3.connect(tmp_path / "app.db")
+    con.execute("DROP TABLE session_summary")
+    con.commit()
+    con.close()
+    from app import create_app, init_db
+    app = create_app()
+    client = _login(app)
+    resp = client.get("/courses/1")
+    assert resp.status_code == 500 and "session_summary" in resp.get_data(as_text=True)
+    assert "flask init-db" in resp.get_data(as_text=True)
+    result = app.test_cli_runner().invoke(args=["archive-sessions"])
+    assert result.exit_code != 0 and "flask init-db" in result.output
+    init_db(app)   # creates only the missing table
+    assert client.get("/courses/1").status_code == 200
+    assert client.get("/attendance/present/1.json").status_code == 200
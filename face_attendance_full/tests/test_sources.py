@@ -0,0 +1,87 @@
+# tests/test_sources.py
+# Synthetic and replayed frames through the same detection/recognition/marking
+# path the session workers use.
+#   python -m pytest -q tests
+import os, sys
+from datetime import datetime
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'app.db'}")
+    from app import create_app, init_db
+    app = create_app()
+    app.config.update(
+        MODEL_DIR=str(tmp_path), LBPH_MODEL=str(tmp_path / "lbph.yml"), LABELS_JSON=str(tmp_path / "labels.json"),
+        RECOGNIZER_BACKEND="lbph", RECOGNITION_SCOPE="global",
+    )
+    init_db(app)
+    from models import db, Course, Student, Enrollment, AttendanceSession
+    from vision.recognizer import train_lbph_model
+    codes = sorted(d for d in os.listdir(app.config["DATASET_DIR"])
+                   if os.path.isdir(os.path.join(app.config["DATASET_DIR"], d)))
+    with app.app_context():
+        db.session.add(Course(id=1, code="C1", title="Course"))
+        for i, code in enumerate(codes, 1):
+            db.session.add(Student(id=i, student_code=code, name=f"Student {i}"))
+            db.session.add(Enrollment(student_id=i, course_id=1))
+        db.session.add(AttendanceSession(id=1, course_id=1, started_at=datetime(2025, 1, 10, 9)))
+        db.session.commit()
+        train_lbph_model()
+    return app
+
+def _write_clip(path, frames):
+    import cv2
+    h, w = frames[0].shape[:2]
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (w, h))
+    for frame in frames:
+        out.write(frame)
+    out.release()
+
+def _run(app, src, frames=30):
+    """(frames with a detection, students marked) after `frames` reads of src."""
+    from vision.pipeline import AttendanceMarker, FrameProcessor
+    from vision.recognizer import load_recognizer
+    from vision.resources import borrow_cascade
+    marker = AttendanceMarker(1, 1, None, cooldown=0)
+    recog, label_map = load_recognizer()
+    detected = 0
+    with borrow_cascade(app.config) as cascade:
+        processor = FrameProcessor(app.config, cascade, recog, label_map)
+        for _ in range(frames):
+            ok, frame = src.read()
+            assert ok and frame is not None
+            found = processor.process(frame)
+            detected += bool(found)
+            for _, code, _ in found:
+                student = marker.lookup(code) if code else None
+                if student:
+                    marker.mark(student[0])
+    return detected, marker.marked
+
+@pytest.mark.parametrize("kind", ["synthetic", "file"])
+def test_source_through_processor(app, tmp_path, kind):
+    from models import Attendance
+    from vision.sources import FrameSource, SyntheticSource, FileReplaySource, open_source
+    synthetic = SyntheticSource(app.config["DATASET_DIR"], size=(640, 360), faces=2, seed=1)
+    if kind == "file":
+        _write_clip(tmp_path / "clip.avi", [synthetic.read()[1] for _ in range(10)])
+        src = FileReplaySource(str(tmp_path / "clip.avi"), fps="max", loop=True)
+        assert src.isOpened()
+    else:
+        src = synthetic
+    assert isinstance(src, FrameSource)
+    with app.app_context(), src:
+        detected, marked = _run(app, src)
+        assert detected > 0
+        assert marked and {a.student_id for a in Attendance.query.filter_by(session_id=1)} == marked
+        with pytest.raises(ValueError):
+            open_source("device:")
+
+def test_frame_source_is_abstract():
+    from vision.sources import FrameSource
+    with pytest.raises(TypeError):
+        FrameSource()
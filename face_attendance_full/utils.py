@@ -1,24 +1,142 @@
-from models import db, Enrollment, Attendance, AttendanceSession
+import heapq
+from datetime import datetime
+from operator import itemgetter
+from models import db, Enrollment, Attendance, AttendanceSession, SessionSummary
 
 def attendance_percentages(course_id:int):
-    sessions = AttendanceSession.query.filter_by(course_id=course_id, closed=True).all()
+    """Present % per closed session: archived sessions from their SessionSummary,
+    the rest from grouped counts (one query each, not one per session)."""
+    sessions = (
+        db.session.query(AttendanceSession.id, AttendanceSession.section_id, SessionSummary)
+        .outerjoin(SessionSummary, SessionSummary.session_id == AttendanceSession.id)
+        .filter(AttendanceSession.course_id == course_id, AttendanceSession.closed.is_(True))
+        .order_by(AttendanceSession.id)
+        .all()
+    )
     if not sessions:
         return {"labels": [], "percentages": []}
+    enrolled = dict(
+        db.session.query(Enrollment.section_id, db.func.count())
+        .filter(Enrollment.course_id == course_id)
+        .group_by(Enrollment.section_id)
+    )
+    present = dict(
+        db.session.query(Attendance.session_id, db.func.count())
+        .join(AttendanceSession, Attendance.session_id == AttendanceSession.id)
+        .filter(AttendanceSession.course_id == course_id, AttendanceSession.closed.is_(True),
+                Attendance.status == "present")
+        .group_by(Attendance.session_id)
+    )
     labels, percentages = [], []
-    for s in sessions:
-        total = Enrollment.query.filter_by(course_id=course_id, section_id=s.section_id).count()
-        present = db.session.query(Attendance).filter_by(session_id=s.id, status="present").count()
-        pct = round(100.0 * present / total, 1) if total else 0.0
-        labels.append(f"Sess {s.id}")
+    for sid, section_id, summary in sessions:
+        if summary:
+            total, count = summary.enrolled, summary.present
+        else:
+            total, count = enrolled.get(section_id, 0), present.get(sid, 0)
+        pct = round(100.0 * count / total, 1) if total else 0.0
+        labels.append(f"Sess {sid}")
         percentages.append(pct)
     return {"labels": labels, "percentages": percentages}
 
 def student_attendance_overview(student_id:int):
-    rows = (
+    from archive import archive_reader
+    rows = [
+        (s.id, s.course_id, a.status, a.timestamp) for a, s in
         db.session.query(Attendance, AttendanceSession)
         .join(AttendanceSession, Attendance.session_id == AttendanceSession.id)
-        .filter(Attendance.student_id == student_id)
-        .order_by(Attendance.timestamp.desc())
-        .all()
+        .outerjoin(SessionSummary, SessionSummary.session_id == AttendanceSession.id)
+        .filter(Attendance.student_id == student_id, SessionSummary.session_id.is_(None))
+    ]
+    with archive_reader() as reader:
+        archived = reader.student_rows(student_id)
+    if archived:
+        courses = dict(db.session.query(AttendanceSession.id, AttendanceSession.course_id)
+                       .filter(AttendanceSession.id.in_({sid for sid, _, _ in archived})))
+        rows += [(sid, courses.get(sid), status, ts) for sid, status, ts in archived]
+    rows.sort(key=lambda r: (r[3] or datetime.min, r[0]), reverse=True)   # rows without a timestamp last
+    return [{"session_id": sid, "course_id": course_id, "status": status, "time": ts.isoformat() if ts else None}
+            for sid, course_id, status, ts in rows]
+
+EXPORT_COLUMNS = ["course_code", "course_title", "section", "session_id", "session_started_at",
+                  "student_code", "student_name", "status", "marked_at"]
+
+def _session_filters(stmt, course_id, section_id, since, until):
+    if course_id:
+        stmt = stmt.where(AttendanceSession.course_id == course_id)
+    if section_id:
+        stmt = stmt.where(AttendanceSession.section_id == section_id)
+    if since:
+        stmt = stmt.where(AttendanceSession.started_at >= since)
+    if until:
+        stmt = stmt.where(AttendanceSession.started_at < until)
+    return stmt
+
+def _hot_export_rows(course_id, section_id, since, until, chunk_size):
+    from models import Course, Section, Student
+    stmt = (
+        db.select(Course.code, Course.title, Section.name, AttendanceSession.id, AttendanceSession.started_at,
+                  Student.student_code, Student.name, Attendance.status, Attendance.timestamp)
+        .select_from(Attendance)
+        .join(AttendanceSession, Attendance.session_id == AttendanceSession.id)
+        .join(Course, AttendanceSession.course_id == Course.id)
+        .join(Student, Attendance.student_id == Student.id)
+        .outerjoin(Section, AttendanceSession.section_id == Section.id)
+        .outerjoin(SessionSummary, SessionSummary.session_id == AttendanceSession.id)
+        .where(SessionSummary.session_id.is_(None))   # archived sessions are read from their term file only
+        .order_by(AttendanceSession.started_at, AttendanceSession.id, Student.student_code)
     )
-    return [{"session_id": s.id, "course_id": s.course_id, "status": a.status, "time": a.timestamp.isoformat()} for a, s in rows]
+    stmt = _session_filters(stmt, course_id, section_id, since, until)
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+    try:
+        for row in result:
+            yield tuple(row)
+    finally:
+        result.close()
+
+def _archived_sessions(course_id, section_id, since, until):
+    from models import Course, Section
+    stmt = (
+        db.select(Course.code, Course.title, Section.name, AttendanceSession.id, AttendanceSession.started_at,
+                  SessionSummary.term)
+        .select_from(SessionSummary)
+        .join(AttendanceSession, SessionSummary.session_id == AttendanceSession.id)
+        .join(Course, AttendanceSession.course_id == Course.id)
+        .outerjoin(Section, AttendanceSession.section_id == Section.id)
+        .order_by(AttendanceSession.started_at, AttendanceSession.id)
+    )
+    return db.session.execute(_session_filters(stmt, course_id, section_id, since, until)).all()
+
+def _archived_export_rows(sessions):
+    """Rows of archived sessions: metadata and names from the hot tables,
+    attendance one session at a time from its term archive."""
+    from models import Student
+    from archive import archive_reader
+    with archive_reader() as reader:
+        for code, title, section, sid, started_at, term in sessions:
+            rows = reader.session_rows(term, sid)
+            students = {i: (c, n) for i, c, n in db.session.query(Student.id, Student.student_code, Student.name)
+                        .filter(Student.id.in_([r[0] for r in rows]))}
+            out = [(code, title, section, sid, started_at) + students[student_id] + (status, ts)
+                   for student_id, status, ts in rows if student_id in students]
+            out.sort(key=itemgetter(5))
+            yield from out
+
+def attendance_export_rows(course_id=None, section_id=None, since=None, until=None, chunk_size=1000):
+    """
+    Attendance rows (tuples in EXPORT_COLUMNS order) for a course/section and a
+    session start-time range [since, until), oldest session first, from the hot
+    tables and the term archives. Hot rows come from a server-side cursor in
+    chunks of chunk_size and archived ones a session at a time, so memory stays
+    flat however many rows match.
+    """
+    archived = _archived_sessions(course_id, section_id, since, until)
+    hot = _hot_export_rows(course_id, section_id, since, until, chunk_size)
+    if not archived:
+        yield from hot
+        return
+    old = _archived_export_rows(archived)
+    try:
+        yield from heapq.merge(hot, old, key=itemgetter(4, 3, 5))
+    finally:
+        hot.close()
+        old.close()
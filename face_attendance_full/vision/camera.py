@@ -0,0 +1,246 @@
+# vision/camera.py
+# Camera discovery. The (backend, index/url) search is slow because every failed
+# cv2.VideoCapture can take seconds, so the winning combination is persisted and
+# tried first. Without a working cache entry only the configured default is
+# tried inline; the full search always runs in a background thread.
+import os, json, time, platform, threading, itertools
+import cv2
+from flask import current_app
+
+_probe_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_reprobe_lock = threading.Lock()   # held by the one background probe thread
+_last_probe = {"at": None, "timings": []}
+
+def _cfg(key, default=None):
+    try:
+        return current_app.config.get(key, default)
+    except Exception:
+        return default
+
+def _cache_path():
+    return _cfg("CAMERA_PROBE_CACHE")
+
+def _source(src=None):
+    if src is None:
+        src = _cfg("CAMERA_SOURCE", 0)
+    if isinstance(src, str) and src.strip().isdigit():
+        src = int(src)
+    return src
+
+def _source_key(src=None):
+    return repr(_source(src))
+
+def _backend(b):
+    """cv2.CAP_* constant from a name like "MSMF" (ints pass through)."""
+    return getattr(cv2, "CAP_" + b.upper()) if isinstance(b, str) else int(b)
+
+def _candidates(src=None):
+    """All (url | index, backend) combinations in the order they are tried."""
+    src = _source(src)
+    backends = [_backend(b) for b in _cfg("CAMERA_BACKENDS", ["MSMF", "DSHOW", "ANY"])]
+    indices  = _cfg("CAMERA_INDICES", [0, 1, 2, 3])
+
+    out = []
+    # 1) URL string
+    if isinstance(src, str) and src.strip():
+        out.append({"url": src})
+
+    # Build index order: try the configured source first (if int), then the rest
+    try_indices = []
+    if isinstance(src, int):
+        try_indices.append(src)
+    for i in indices:
+        if i not in try_indices:
+            try_indices.append(i)
+
+    # 2) Try (backend, index)
+    for be, idx in itertools.product(backends, try_indices):
+        out.append({"index": idx, "backend": int(be)})
+
+    # 3) FINAL FALLBACK: plain VideoCapture(index) WITHOUT backend
+    for idx in try_indices:
+        out.append({"index": idx, "backend": "auto"})
+    return out
+
+def _describe(cand):
+    if "url" in cand:
+        return f"url {cand['url']}"
+    if cand["backend"] == "auto":
+        return f"index={cand['index']} (no backend)"
+    return f"index={cand['index']} backend={cand['backend']}"
+
+def _open_candidate(cand):
+    """Open one combination. Returns (cam | None, timing dict)."""
+    width, height = _cfg("CAMERA_RESOLUTION", (1280, 720))
+    t0 = time.perf_counter()
+    cam, error = None, None
+    try:
+        if "url" in cand:
+            cam = cv2.VideoCapture(cand["url"])
+        elif cand["backend"] == "auto":
+            cam = cv2.VideoCapture(cand["index"])
+        else:
+            cam = cv2.VideoCapture(cand["index"], cand["backend"])
+        if cam is not None and cam.isOpened():
+            cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        else:
+            if cam is not None:
+                cam.release()
+            cam, error = None, "not opened"
+    except Exception as e:
+        cam, error = None, f"error={e}"
+    timing = dict(cand, ok=cam is not None, ms=round((time.perf_counter() - t0) * 1000, 1))
+    if cam is not None:
+        timing["resolution"] = [int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))]
+    else:
+        timing["error"] = f"{_describe(cand)} {error}"
+    return cam, timing
+
+def _read_cache_file():
+    path = _cache_path()
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _write_cache_file(data):
+    path = _cache_path()
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def _load_cache(src=None):
+    """Cached winner for this source; entries are keyed by the configured source."""
+    return _read_cache_file().get(_source_key(src))
+
+def _save_cache(timing, src=None):
+    data = {k: timing[k] for k in ("url", "index", "backend", "resolution", "ms") if k in timing}
+    data["probed_at"] = time.time()
+    with _cache_lock:
+        cache = _read_cache_file()
+        cache[_source_key(src)] = data
+        _write_cache_file(cache)
+
+def _clear_cache(src=None):
+    with _cache_lock:
+        cache = _read_cache_file()
+        if cache.pop(_source_key(src), None) is not None:
+            _write_cache_file(cache)
+
+def probe_cameras(exhaustive=False, src=None):
+    """
+    Walk the candidate list, timing each combination. Stops at the first camera
+    unless exhaustive, in which case the fastest working one wins. The winner is
+    persisted; returns (cam | None, timings). The returned cam is left open.
+    """
+    with _probe_lock:
+        timings, best, best_cam = [], None, None
+        for cand in _candidates(src):
+            cam, timing = _open_candidate(cand)
+            timings.append(timing)
+            if cam is None:
+                continue
+            if best is None or timing["ms"] < best["ms"]:
+                if best_cam is not None:
+                    best_cam.release()
+                best, best_cam = timing, cam
+            else:
+                cam.release()
+            if not exhaustive:
+                break
+        _last_probe.update(at=time.time(), timings=timings)
+        if best is not None:
+            _save_cache(best, src)
+        return best_cam, timings
+
+def probing():
+    return _reprobe_lock.locked()
+
+def reprobe_in_background(src=None, exhaustive=False):
+    """Start a full probe in a daemon thread (at most one at a time)."""
+    if not _reprobe_lock.acquire(blocking=False):
+        return False
+    try:
+        app = current_app._get_current_object()
+    except Exception:
+        _reprobe_lock.release()
+        raise
+    def run():
+        try:
+            with app.app_context():
+                cam, _ = probe_cameras(exhaustive=exhaustive, src=src)
+                if cam is not None:
+                    cam.release()
+        finally:
+            _reprobe_lock.release()
+    threading.Thread(target=run, name="camera-reprobe", daemon=True).start()
+    return True
+
+def _default_candidate(src=None):
+    """The configured source as-is: the URL, or the index with OpenCV's default backend."""
+    src = _source(src)
+    return {"url": src} if isinstance(src, str) and src.strip() else {"index": src, "backend": "auto"}
+
+def open_camera(src=None):
+    """
+    Open the camera (CAMERA_SOURCE unless src is given), trying the cached
+    combination, or without one the configured default. Never runs the full
+    search on the caller's thread: on failure it starts a background probe
+    and later calls pick its winner up from the cache. Returns (cam, meta);
+    meta["cached"] tells whether the cached combination was used.
+    """
+    cached = _load_cache(src)
+    if cached is not None:
+        cand = {k: cached[k] for k in ("url", "index", "backend") if k in cached}
+    elif probing():
+        return None, {"errors": ["camera probe in progress"], "hint": "Retry in a few seconds."}
+    else:
+        cand = _default_candidate(src)
+    cam, timing = _open_candidate(cand)
+    if cam is not None:
+        if cached is None:
+            _save_cache(timing, src)
+        return cam, dict(cand, cached=cached is not None, ms=timing["ms"], resolution=timing.get("resolution"))
+    if cached is not None:
+        _clear_cache(src)   # cached camera vanished
+    reprobe_in_background(src)
+    return None, {
+        "errors": [timing["error"], "probing cameras in the background"],
+        "hint": "Retry in a few seconds; see /attendance/camera-probe for probe timings. If nothing is found, "
+                "adjust CAMERA_SOURCE/CAMERA_INDICES (0/1/2/3) and camera privacy settings; close apps using the camera.",
+    }
+
+def probe_report(run=False):
+    """Per-combination probe timings; run=True starts a probe of every combination
+    in the background (poll this report until "probing" is false)."""
+    started = reprobe_in_background(exhaustive=True) if run else False
+    cached = _load_cache()
+    return {
+        "ok": cached is not None,
+        "cached": cached,
+        "probing": probing(),
+        "probe_started": started,
+        "last_probe_at": _last_probe["at"],
+        "timings": _last_probe["timings"],
+        "platform": platform.platform(),
+    }
+
+def camera_diagnostics():
+    cam, meta = open_camera()
+    if cam is None:
+        return {"ok": False, "meta": meta, "platform": platform.platform()}
+    ret, frame = cam.read()
+    cam.release()
+    if not ret or frame is None:
+        return {"ok": False, "meta": {"error": "read() failed"}, "platform": platform.platform()}
+    return {"ok": True, "meta": meta, "platform": platform.platform(), "shape": [int(frame.shape[1]), int(frame.shape[0])]}
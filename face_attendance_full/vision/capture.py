@@ -0,0 +1,189 @@
+# vision/capture.py
+# Guided 3-shot capture as a non-blocking session: frames arrive from the
+# browser (or from the server camera's pipeline worker) and are evaluated off
+# the request thread.
+import os, time, uuid, threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2, numpy as np
+from .dataset import _prep, _save_face
+from .resources import cascade_pool
+
+PROMPTS = [
+    ("Front", "Look straight ahead."),
+    ("Left",  "Turn your head slightly LEFT."),
+    ("Right", "Turn your head slightly RIGHT."),
+]
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="capture")
+
+class CaptureSession:
+    def __init__(self, student_code, person_dir, cascades, scale, neighbors, size, timeout, pause=1.0):
+        self.id = uuid.uuid4().hex
+        self.student_code = student_code
+        self.person_dir = person_dir
+        self.scale = scale
+        self.neighbors = neighbors
+        self.size = tuple(size)
+        self.started_at = time.time()
+        self.deadline = self.started_at + timeout
+        self.pause = pause
+        self.step = 0
+        self.saved = []
+        self.state = "running"       # running | done | timeout | cancelled | failed
+        self.error = None
+        self.frames_seen = 0
+        self.frames_dropped = 0
+        self.last_faces = 0
+        self._cascades = cascades    # shared CascadePool
+        self._busy = False
+        self._hold_until = 0.0       # give the student time to turn between prompts
+        self._lock = threading.Lock()
+
+    def _check_timeout(self):
+        if self.state == "running" and time.time() > self.deadline:
+            self.state = "timeout"
+
+    @property
+    def active(self):
+        with self._lock:
+            self._check_timeout()
+            return self.state == "running"
+
+    def submit(self, frame):
+        """Queue one frame (BGR array or encoded image bytes). Never blocks; a frame
+        arriving while the previous one is still being evaluated is dropped."""
+        with self._lock:
+            self._check_timeout()
+            if self.state != "running" or time.time() < self._hold_until:
+                return False
+            if self._busy:
+                self.frames_dropped += 1
+                return False
+            self._busy = True
+        _executor.submit(self._evaluate, frame)
+        return True
+
+    def cancel(self, error=None):
+        with self._lock:
+            if self.state == "running":
+                self.state = "failed" if error else "cancelled"
+                self.error = error
+
+    def _evaluate(self, frame):
+        try:
+            if isinstance(frame, (bytes, bytearray)):
+                frame = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return
+            gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray = _prep(gray)
+            with self._cascades.borrow() as cascade:
+                faces = cascade.detectMultiScale(gray, scaleFactor=self.scale, minNeighbors=self.neighbors)
+            with self._lock:
+                self.frames_seen += 1
+                self.last_faces = len(faces)
+                if self.state != "running" or not len(faces):
+                    return
+            (x,y,w,h) = max(faces, key=lambda b: b[2]*b[3])
+            with self._lock:
+                # write under the lock: a cancel/timeout can't land between the check and the file
+                self._check_timeout()
+                if self.state != "running":
+                    return
+                path = _save_face(gray[y:y+h, x:x+w], self.person_dir, self.size)
+                self.saved.append(os.path.basename(path))
+                self.step += 1
+                self._hold_until = time.time() + self.pause
+                if self.step >= len(PROMPTS):
+                    self.state = "done"
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def status(self):
+        with self._lock:
+            self._check_timeout()
+            prompt = PROMPTS[self.step] if self.state == "running" else None
+            return {
+                "id": self.id,
+                "student_code": self.student_code,
+                "state": self.state,
+                "error": self.error,
+                "step": self.step,
+                "steps": [
+                    {"title": t, "tip": tip, "done": i < self.step}
+                    for i, (t, tip) in enumerate(PROMPTS)
+                ],
+                "prompt": {"title": prompt[0], "tip": prompt[1]} if prompt else None,
+                "saved": len(self.saved),
+                "faces_in_last_frame": self.last_faces,
+                "frames_seen": self.frames_seen,
+                "frames_dropped": self.frames_dropped,
+                "seconds_left": max(0.0, round(self.deadline - time.time(), 1)),
+            }
+
+def _reap(now, keep_seconds=300):
+    with _sessions_lock:
+        for sid in [sid for sid, s in _sessions.items()
+                    if not s.active and now - s.deadline > keep_seconds]:
+            del _sessions[sid]
+
+def start_capture(app, student_code):
+    _reap(time.time())
+    s = CaptureSession(
+        student_code,
+        os.path.join(app.config["DATASET_DIR"], student_code),
+        cascade_pool(app.config),
+        app.config["DETECTION_SCALE_FACTOR"],
+        app.config["DETECTION_MIN_NEIGHBORS"],
+        app.config["CAPTURE_IMAGE_SIZE"],
+        app.config.get("CAPTURE_SESSION_TIMEOUT_SECONDS", 60),
+        app.config.get("CAPTURE_STEP_PAUSE_SECONDS", 1.0),
+    )
+    with _sessions_lock:
+        _sessions[s.id] = s
+    return s
+
+def get_capture(capture_id):
+    with _sessions_lock:
+        return _sessions.get(capture_id)
+
+def feed_from_server_camera(app, session, camera=None):
+    """Feed a capture session from the server camera's pipeline worker (a running
+    attendance session's, or a sessionless feed) in a daemon thread, so the
+    device is never opened twice. The thread stops on completion, cancel or
+    timeout, so no request waits on it."""
+    from .pipeline import camera_feed
+    interval = app.config.get("CAPTURE_FRAME_INTERVAL_SECONDS", 0.25)
+
+    def run():
+        pipeline = camera_feed(app, camera)
+        pipeline.attach()
+        try:
+            seq = 0
+            while session.active:
+                worker = pipeline.worker(camera)
+                if not worker.is_alive() and worker.opened:
+                    # the session that owned the camera stopped: move to a feed of our own
+                    pipeline.detach()
+                    pipeline = camera_feed(app, camera)
+                    pipeline.attach()
+                    seq = 0
+                    continue
+                seq, frame, _ = worker.slot.wait(seq, timeout=1.0)
+                if not worker.opened:
+                    errors = worker.meta.get("errors") if isinstance(worker.meta, dict) else None
+                    if errors or not worker.is_alive():
+                        session.cancel(error=errors[0] if errors else "Camera not available")
+                        return
+                    continue
+                if frame is not None:
+                    session.submit(frame)
+                time.sleep(interval)
+        finally:
+            pipeline.detach()
+    t = threading.Thread(target=run, name=f"capture-feed-{session.id[:8]}", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,223 @@
+# vision/evaluate.py
+# Offline accuracy evaluation and threshold calibration over dataset/.
+# Every probe-to-gallery distance is computed up front as one matrix (LBPH: a
+# NumPy reimplementation of OpenCV's LBP histograms and chi-square distance,
+# factored into matrix multiplies; embedding: cosine distance), and k-fold / leave-one-out
+# splits are masks over it, so each probe isn't a separate predict() call and
+# every threshold is scored at once.
+import time
+import numpy as np
+from flask import current_app as app
+from .recognizer import _list_images, EmbeddingRecognizer
+
+# -------------------- DISTANCES --------------------
+
+def lbp_counts(images, radius=1, neighbors=8, grid=(8, 8)):
+    """
+    Spatial LBP histograms as raw per-cell counts: ((N, grid_x*grid_y*2**neighbors)
+    int16, pixels per cell). counts / pixels is exactly what
+    cv2.face.LBPHFaceRecognizer stores (same float32 circular interpolation,
+    same cells, each cell L1-normalized).
+    """
+    n_bins = 2 ** neighbors
+    gx, gy = grid
+    out, cell_pixels = [], 0
+    one = np.float32(1)
+    for img in images:
+        src = img.astype(np.float32)
+        h, w = src.shape
+        center = src[radius:h - radius, radius:w - radius]
+        codes = np.zeros(center.shape, np.int32)
+        for n in range(neighbors):
+            x = np.float32(radius * np.cos(2.0 * np.pi * n / np.float32(neighbors)))
+            y = np.float32(-radius * np.sin(2.0 * np.pi * n / np.float32(neighbors)))
+            fx, fy, cx, cy = int(np.floor(x)), int(np.floor(y)), int(np.ceil(x)), int(np.ceil(y))
+            tx, ty = x - fx, y - fy
+            shifted = lambda dy, dx: src[radius + dy:h - radius + dy, radius + dx:w - radius + dx]
+            t = ((one - tx) * (one - ty) * shifted(fy, fx) + tx * (one - ty) * shifted(fy, cx)
+                 + (one - tx) * ty * shifted(cy, fx) + tx * ty * shifted(cy, cx))
+            codes += ((t > center) | (np.abs(t - center) < np.finfo(np.float32).eps)).astype(np.int32) << n
+        ch, cw = codes.shape[0] // gy, codes.shape[1] // gx
+        cells = codes[:ch * gy, :cw * gx].reshape(gy, ch, gx, cw).transpose(0, 2, 1, 3).reshape(gy * gx, ch * cw)
+        offsets = (np.arange(gy * gx) * n_bins)[:, None]
+        out.append(np.bincount((cells + offsets).ravel(), minlength=gy * gx * n_bins).astype(np.int16))
+        cell_pixels = ch * cw
+    counts = np.stack(out) if out else np.empty((0, gx * gy * n_bins), np.int16)
+    return counts, cell_pixels
+
+def lbp_histograms(images, **kw):
+    """Float32 histograms as stored by LBPH (counts / pixels per cell)."""
+    counts, cell_pixels = lbp_counts(images, **kw)
+    return counts.astype(np.float32) / np.float32(cell_pixels)
+
+def _harmonic_features(cell_pixels, tol=1e-10):
+    """
+    (R, cell_pixels+1) table phi with sum_r phi[r,x]*phi[r,y] == x*y/(x+y) for
+    integer counts x, y (eigendecomposition of that positive-definite kernel;
+    it has numerical rank ~16, so R is small).
+    """
+    x = np.arange(cell_pixels + 1, dtype=np.float64)
+    s = x[:, None] + x[None, :]
+    kernel = np.divide(np.outer(x, x), s, out=np.zeros_like(s), where=s > 0)
+    w, q = np.linalg.eigh(kernel)
+    keep = w > w.max() * tol
+    return (q[:, keep] * np.sqrt(w[keep])).T.astype(np.float32)
+
+def chi2_matrix(probes, gallery=None, cell_pixels=576, budget_mb=256):
+    """
+    (P, G) LBPH distances (compareHist HISTCMP_CHISQR_ALT) between lbp_counts()
+    rows. Per bin, with counts x, y out of n pixels:
+        2*(x-y)^2 / (n*(x+y)) = 2*(x+y)/n - (8/n) * x*y/(x+y)
+    The first term sums to a per-row constant and x*y/(x+y) factors into a few
+    per-count features, so the whole matrix is ~16 matrix multiplies instead of
+    P*G*bins divisions. Matches OpenCV to ~1e-4. gallery=None: probes vs themselves.
+    """
+    same = gallery is None
+    gallery = probes if same else gallery
+    rows = max(1, int(budget_mb * 2**20 / (4 * probes.shape[1])))   # probe rows per block
+    acc = np.zeros((len(probes), len(gallery)), np.float32)
+    for table in _harmonic_features(cell_pixels):
+        zg = table[gallery]
+        for i in range(0, len(probes), rows):
+            zp = zg[i:i + rows] if same else table[probes[i:i + rows]]
+            acc[i:i + rows] += zp @ zg.T
+    mass = 2.0 * (probes.sum(axis=1)[:, None] + gallery.sum(axis=1)[None, :]) / cell_pixels
+    return (mass - (8.0 / cell_pixels) * acc).astype(np.float32)
+
+def cosine_matrix(probes, gallery):
+    """(P, G) cosine distances between L2-normalized embeddings: one matmul."""
+    return 1.0 - probes @ gallery.T
+
+# -------------------- SPLITS --------------------
+
+def make_folds(labels, k=5, seed=0):
+    """Fold id per image, stratified per person. k=0: leave-one-out."""
+    if k == 0:
+        return np.arange(len(labels))
+    rng = np.random.default_rng(seed)
+    folds = np.empty(len(labels), np.int32)
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        folds[rng.permutation(idx)] = np.arange(len(idx)) % k
+    return folds
+
+def lbph_distances(images, folds, budget_mb=256):
+    """Probe-to-gallery LBPH distances; same-fold pairs (not in that probe's gallery) are inf."""
+    counts, cell_pixels = lbp_counts(images)
+    dist = chi2_matrix(counts, cell_pixels=cell_pixels, budget_mb=budget_mb)
+    dist[folds[:, None] == folds[None, :]] = np.inf
+    return dist
+
+def embedding_distances(images, labels, folds, input_size=(64, 64), dims=32):
+    """The projection is learned from training data, so fit once per fold."""
+    dist = np.full((len(images), len(images)), np.inf, np.float32)
+    for f in np.unique(folds):
+        test, train = np.flatnonzero(folds == f), np.flatnonzero(folds != f)
+        if len(np.unique(labels[train])) < 2:
+            continue
+        rec = EmbeddingRecognizer.fit([images[i] for i in train], labels[train], input_size=input_size, dims=dims)
+        dist[np.ix_(test, train)] = cosine_matrix(rec.embed([images[i] for i in test]), rec.embeddings)
+    return dist
+
+# -------------------- SCORING --------------------
+
+def per_person_best(dist, labels, n_classes):
+    """(N, C) distance from each probe to the nearest gallery image of each person."""
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    present = np.unique(labels)   # people without images (empty dataset dirs) stay inf
+    best = np.full((len(dist), n_classes), np.inf, dist.dtype)
+    best[:, present] = np.minimum.reduceat(dist[:, order], np.searchsorted(sorted_labels, present), axis=1)
+    return best
+
+def _rates(genuine, impostor, thresholds):
+    """FRR: genuine probe's own person farther than t. FAR: nearest *other* person
+    within t (someone not enrolled would be accepted as them)."""
+    g, i = np.sort(genuine), np.sort(impostor)
+    frr = 1.0 - np.searchsorted(g, thresholds, side="right") / max(len(g), 1)
+    far = np.searchsorted(i, thresholds, side="right") / max(len(i), 1)
+    return far, frr
+
+def evaluate(backend=None, folds=5, seed=0, target_fars=(0.001, 0.01, 0.05), threshold=None, points=50,
+             budget_mb=256):
+    """
+    Evaluate RECOGNIZER_BACKEND on DATASET_DIR with k-fold (folds=0: leave-one-out)
+    splits. Returns a JSON-able report: ROC (FAR/FRR per threshold), the threshold
+    for each target FAR, rank-1 accuracy and per-student confusion at `threshold`
+    (default: the configured one).
+    """
+    cfg = app.config
+    backend = backend or cfg.get("RECOGNIZER_BACKEND", "lbph")
+    timings = {}
+    t0 = time.perf_counter()
+    images, labels, label_map = _list_images(cfg["DATASET_DIR"])
+    if len(np.unique(labels)) < 2:
+        raise RuntimeError("Need images of at least two people to evaluate.")
+    timings["load_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    fold_ids = make_folds(labels, folds, seed)
+
+    t0 = time.perf_counter()
+    if backend == "embedding":
+        dist = embedding_distances(images, labels, fold_ids, tuple(cfg.get("EMBEDDING_INPUT_SIZE", (64, 64))),
+                                   cfg.get("EMBEDDING_DIMS", 32))
+        configured = cfg.get("EMBEDDING_DISTANCE_THRESHOLD", 0.35)
+    else:
+        dist = lbph_distances(images, fold_ids, budget_mb)
+        configured = cfg.get("RECOGNITION_CONFIDENCE_THRESHOLD", 95)
+    timings["distances_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    t0 = time.perf_counter()
+    n, n_classes = len(labels), len(label_map)
+    best = per_person_best(dist, labels, n_classes)
+    rows = np.arange(n)
+    genuine = best[rows, labels]
+    others = best.copy()
+    others[rows, labels] = np.inf
+    impostor = others.min(axis=1)
+    has_gallery = np.isfinite(genuine)
+    genuine, impostor_f = genuine[has_gallery], impostor[np.isfinite(impostor)]
+
+    finite = np.concatenate([genuine, impostor_f])
+    thresholds = np.unique(np.quantile(finite, np.linspace(0, 1, points))) if len(finite) else np.array([configured])
+    far, frr = _rates(genuine, impostor_f, thresholds)
+
+    recommended = []
+    imp_sorted = np.sort(impostor_f)
+    for target in target_fars:
+        allowed = int(np.floor(target * len(imp_sorted)))
+        t = float(np.nextafter(imp_sorted[allowed], -np.inf)) if allowed < len(imp_sorted) else float(finite.max())
+        f, r = _rates(genuine, impostor_f, np.array([t]))
+        recommended.append({"target_far": target, "threshold": round(t, 4), "far": round(float(f[0]), 4),
+                            "frr": round(float(r[0]), 4)})
+
+    threshold = configured if threshold is None else threshold
+    predicted = best.argmin(axis=1)
+    accepted = best[rows, predicted] <= threshold
+    confusion = {}
+    for code_label, code in label_map.items():
+        mine = labels == code_label
+        if not mine.any():
+            continue
+        counts = {"probes": int(mine.sum()), "rejected": int((mine & ~accepted).sum())}
+        for p, c in zip(*np.unique(predicted[mine & accepted], return_counts=True)):
+            counts[label_map[int(p)]] = int(c)
+        confusion[code] = counts
+    f, r = _rates(genuine, impostor_f, np.array([threshold]))
+    timings["scoring_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    return {
+        "backend": backend,
+        "images": n,
+        "people": int(len(np.unique(labels))),
+        "split": "leave-one-out" if folds == 0 else f"{folds}-fold",
+        "rank1_accuracy": round(float((predicted == labels)[has_gallery].mean()), 4) if has_gallery.any() else None,
+        "configured_threshold": configured,
+        "at_threshold": {"threshold": threshold, "far": round(float(f[0]), 4), "frr": round(float(r[0]), 4),
+                         "accuracy": round(float(((predicted == labels) & accepted)[has_gallery].mean()), 4)
+                         if has_gallery.any() else None},
+        "recommended": recommended,
+        "roc": [{"threshold": round(float(t), 6), "far": round(float(a), 4), "frr": round(float(b), 4)}
+                for t, a, b in zip(thresholds, far, frr)],
+        "confusion": confusion,
+        "timings": timings,
+    }
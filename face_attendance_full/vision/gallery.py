@@ -0,0 +1,101 @@
+# vision/gallery.py
+# Session-scoped recognition: an LBPH model trained only on the students enrolled
+# in a (course, section), so predict cost follows class size rather than school
+# size and students from other courses can never match.
+import os, json, hashlib, threading
+import cv2, numpy as np
+from flask import current_app as app
+from models import Student, Enrollment
+from .recognizer import (_list_images, _validate_training_set, _train_with_fallbacks,
+                         load_recognizer, load_embedding_model, read_lbph, lbph_pool)
+from .resources import shared_model
+
+_build_lock = threading.Lock()
+
+def roster_codes(course_id, section_id=None):
+    """Student codes enrolled in the course (and section, if given)."""
+    q = Enrollment.query.filter_by(course_id=course_id)
+    if section_id:
+        q = q.filter_by(section_id=section_id)
+    ids = [e.student_id for e in q.all()]
+    if not ids:
+        return []
+    return sorted(st.student_code for st in Student.query.filter(Student.id.in_(ids)).all())
+
+def _fingerprint(dataset_dir, codes):
+    """Changes when the roster or any of its students' images change."""
+    h = hashlib.sha1()
+    for code in codes:
+        pdir = os.path.join(dataset_dir, code)
+        h.update(code.encode("utf-8") + b"\0")
+        if os.path.isdir(pdir):
+            for fname in sorted(os.listdir(pdir)):
+                st = os.stat(os.path.join(pdir, fname))
+                h.update(f"{fname}:{st.st_size}:{int(st.st_mtime)}\0".encode("utf-8"))
+    return h.hexdigest()
+
+def _paths(course_id, section_id):
+    gdir = app.config.get("GALLERY_DIR") or os.path.join(app.config["MODEL_DIR"], "galleries")
+    stem = f"course{course_id}_section{section_id or 'all'}"
+    return gdir, os.path.join(gdir, stem + ".yml"), os.path.join(gdir, stem + ".json")
+
+def load_gallery(course_id, section_id=None):
+    """
+    (recognizer, {label: student_code}) for the roster of a course/section, built
+    from dataset/ on first use and cached under MODEL_DIR/galleries/ until the
+    roster or its images change. (None, None) when nobody on the roster has images.
+    """
+    dataset_dir = app.config["DATASET_DIR"]
+    codes = [c for c in roster_codes(course_id, section_id) if os.path.isdir(os.path.join(dataset_dir, c))]
+    if not codes:
+        return None, None
+    key = _fingerprint(dataset_dir, codes)
+    gdir, model_path, meta_path = _paths(course_id, section_id)
+
+    with _build_lock:
+        if os.path.exists(model_path) and os.path.exists(meta_path):
+            cached_key, recognizer, label_map = shared_model((model_path, meta_path),
+                                                             lambda: _read_gallery(model_path, meta_path))
+            if cached_key == key:
+                return recognizer, label_map
+
+        images, labels_np, label_map = _list_images(dataset_dir, persons=codes)
+        _validate_training_set(images, labels_np)
+        images = [np.ascontiguousarray(im, dtype=np.uint8) for im in images]
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        _train_with_fallbacks(recognizer, images, labels_np)
+
+        os.makedirs(gdir, exist_ok=True)
+        recognizer.write(model_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "course_id": course_id, "section_id": section_id,
+                       "labels": label_map}, f, ensure_ascii=False, indent=2)
+        app.logger.info("gallery trained: course=%s section=%s persons=%d images=%d",
+                        course_id, section_id, len(label_map), len(images))
+        return lbph_pool(model_path, recognizer), label_map
+
+def _read_gallery(model_path, meta_path):
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return meta.get("key"), lbph_pool(model_path, read_lbph(model_path)), {int(k): v for k, v in meta["labels"].items()}
+
+def load_embedding_gallery(course_id, section_id=None):
+    """Embedding backend: the roster is a row subset of the global gallery matrix,
+    so nothing needs retraining."""
+    recognizer, label_map = load_embedding_model()
+    if recognizer is None:
+        return None, None
+    codes = set(roster_codes(course_id, section_id))
+    keep = {label: code for label, code in label_map.items() if code in codes}
+    if not keep:
+        return None, None
+    return recognizer.subset(keep), keep
+
+def load_session_recognizer(course_id, section_id=None):
+    """Recognizer for a session according to RECOGNITION_SCOPE ("session" or "global")
+    and RECOGNIZER_BACKEND ("lbph" or "embedding")."""
+    if app.config.get("RECOGNITION_SCOPE", "session") != "session":
+        return load_recognizer()
+    if app.config.get("RECOGNIZER_BACKEND", "lbph") == "embedding":
+        return load_embedding_gallery(course_id, section_id)
+    return load_gallery(course_id, section_id)
@@ -0,0 +1,127 @@
+# vision/metrics.py
+# Lightweight timing hooks for the vision hot path. Each (session, stage) pair
+# keeps a rolling window of recent samples (for percentiles) and cumulative
+# Prometheus-style bucket counters. When METRICS_ENABLED is off, timer() hands
+# back one shared no-op context manager, so the hooks cost a function call.
+import time, threading
+from collections import deque
+
+STAGES = ("read", "preprocess", "detect", "predict", "mark", "encode", "train")
+BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_enabled = False
+_window = 256
+_series = {}            # (key, stage) -> StageHistogram
+_lock = threading.Lock()
+
+def configure(config):
+    global _enabled, _window
+    _enabled = bool(config.get("METRICS_ENABLED", False))
+    _window = int(config.get("METRICS_WINDOW", 256))
+
+def enabled():
+    return _enabled
+
+class StageHistogram:
+    def __init__(self, window):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * (len(BUCKETS_S) + 1)   # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS_S) and seconds > BUCKETS_S[i]:
+            i += 1
+        with self._lock:
+            self.recent.append(seconds)
+            self.buckets[i] += 1
+            self.count += 1
+            self.total += seconds
+
+    def summary(self):
+        with self._lock:
+            recent = sorted(self.recent)
+            count, total = self.count, self.total
+        if not recent:
+            return {"count": count}
+        pick = lambda q: round(recent[min(len(recent) - 1, int(len(recent) * q))] * 1000, 3)
+        return {"count": count, "window": len(recent), "p50_ms": pick(0.5), "p95_ms": pick(0.95),
+                "max_ms": round(recent[-1] * 1000, 3), "mean_ms": round(total / count * 1000, 3)}
+
+def _series_for(key, stage):
+    s = _series.get((key, stage))
+    if s is None:
+        with _lock:
+            s = _series.setdefault((key, stage), StageHistogram(_window))
+    return s
+
+def observe(key, stage, seconds):
+    if _enabled and key is not None:
+        _series_for(str(key), stage).observe(seconds)
+
+class _Timer:
+    __slots__ = ("series", "t0")
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.series.observe(time.perf_counter() - self.t0)
+        return False
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+def timer(key, stage):
+    """`with timer(session_id, "detect"): ...` records the block's duration."""
+    if not _enabled or key is None:
+        return _NOOP
+    return _Timer(_series_for(str(key), stage))
+
+def snapshot(key=None):
+    """{key: {stage: summary}} (one key if given)."""
+    with _lock:
+        items = list(_series.items())
+    out = {}
+    for (k, stage), s in items:
+        if key is None or k == str(key):
+            out.setdefault(k, {})[stage] = s.summary()
+    return out
+
+def reset(key):
+    with _lock:
+        for k in [k for k in _series if k[0] == str(key)]:
+            del _series[k]
+
+def prometheus_text():
+    """Prometheus text exposition of the cumulative histograms."""
+    with _lock:
+        items = sorted(_series.items())
+    lines = ["# HELP face_stage_seconds Time spent per vision pipeline stage.",
+             "# TYPE face_stage_seconds histogram"]
+    for (k, stage), s in items:
+        with s._lock:
+            buckets, count, total = list(s.buckets), s.count, s.total
+        labels = f'session="{k}",stage="{stage}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS_S, buckets):
+            cumulative += n
+            lines.append(f'face_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'face_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"face_stage_seconds_sum{{{labels}}} {total:.6f}")
+        lines.append(f"face_stage_seconds_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
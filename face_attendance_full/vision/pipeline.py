@@ -0,0 +1,461 @@
+# vision/pipeline.py
+# One attendance session, several cameras. Each frame source gets its own worker
+# thread; workers share a detection scheduler (CPU budget, round-robin) and an
+# attendance marker (cross-camera dedup). Viewers only read the latest frame.
+import time, asyncio, threading
+import cv2, numpy as np
+from sqlalchemy.exc import IntegrityError
+from models import db, Student, Enrollment, Attendance, AttendanceSession, SessionSummary
+from .gallery import load_session_recognizer
+from .recognizer import recognition_threshold
+from .sources import open_source
+from .resources import borrow_cascade
+from . import metrics
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+# session_id -> [camera names] ticked on the start form. Per process and not persisted:
+# after a restart (or in another worker process) the session uses every configured camera.
+_session_sources = {}
+FEED = "feed"           # _pipelines key of the sessionless camera feed (guided capture)
+
+def _error_frame(text, detail=""):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(frame, text, (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 3)
+    if detail:
+        cv2.putText(frame, detail[:48], (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,0), 2)
+    return frame
+
+def camera_sources(app):
+    """Configured cameras as an ordered {name: spec} dict."""
+    sources = app.config.get("CAMERA_SOURCES") or {}
+    if not sources:
+        sources = {"main": app.config.get("CAMERA_SOURCE", 0)}
+    return dict(sources)
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+class Versioned:
+    """
+    A sequence number bumped by producer threads. Consumers wait for it to move
+    past the value they last saw, either blocking a thread (wait_seq) or as an
+    asyncio coroutine (wait_seq_async), which parks no thread at all.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.seq = 0
+        self._async_waiters = []   # (loop, future)
+
+    def _bump(self):
+        # caller holds self._cond
+        self.seq += 1
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut)
+            except RuntimeError:
+                pass   # loop already closed
+
+    def bump(self):
+        with self._cond:
+            self._bump()
+
+    def wait_seq(self, last_seq, timeout=1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq
+
+    async def wait_seq_async(self, last_seq, timeout=1.0):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.seq != last_seq:
+                return self.seq
+            fut = loop.create_future()
+            entry = (loop, fut)
+            self._async_waiters.append(entry)
+        try:
+            await asyncio.wait((fut,), timeout=timeout)
+        finally:
+            with self._cond:
+                if entry in self._async_waiters:
+                    self._async_waiters.remove(entry)
+        return self.seq
+
+class FrameSlot(Versioned):
+    """Latest published frame of one source. Readers never queue: a slow reader
+    simply sees fewer sequence numbers."""
+    def __init__(self):
+        super().__init__()
+        self.frame = None
+        self.detections = []
+        self._encoded = {}    # viewer settings -> (seq, jpeg bytes), shared by viewers
+        self._enc_lock = threading.Lock()
+
+    def publish(self, frame, detections):
+        with self._cond:
+            self.frame = frame
+            self.detections = detections
+            self._bump()
+
+    def latest(self):
+        with self._cond:
+            return self.seq, self.frame, self.detections
+
+    def wait(self, last_seq, timeout=1.0):
+        self.wait_seq(last_seq, timeout)
+        return self.latest()
+
+    async def wait_async(self, last_seq, timeout=1.0):
+        await self.wait_seq_async(last_seq, timeout)
+        return self.latest()
+
+    def encoded(self, seq, key, encode):
+        """JPEG (or other per-frame derivative) for frame `seq` at viewer settings
+        `key`, computed once for all viewers that use the same settings."""
+        with self._enc_lock:
+            hit = self._encoded.get(key)
+        if hit and hit[0] == seq:
+            return hit[1]
+        data = encode()
+        with self._enc_lock:
+            self._encoded[key] = (seq, data)
+        return data
+
+class DetectionScheduler:
+    """
+    Shares a detection budget (max_fps detections/second over all sources) in
+    round-robin order: the worker served least recently goes next. Workers that
+    do not get a turn reuse their last detections, so every feed keeps moving.
+    """
+    def __init__(self, max_fps=None):
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+        self._last_served = {}
+        self._asking = {}
+
+    def try_acquire(self, name):
+        now = time.monotonic()
+        with self._lock:
+            self._asking[name] = now
+            if not self.interval:
+                return True
+            if now < self._next_at:
+                return False
+            recent = [n for n, t in self._asking.items() if now - t < 1.0]
+            turn = min(recent, key=lambda n: self._last_served.get(n, 0.0))
+            if turn != name:
+                return False
+            self._last_served[name] = now
+            self._next_at = now + self.interval
+            return True
+
+class AttendanceMarker:
+    """Marks each enrolled student present once per session, whichever camera saw them.
+    Closed and archived sessions are read-only: their cameras still stream, nothing is marked."""
+    def __init__(self, session_id, course_id, section_id, cooldown, read_only=False):
+        self.session_id = session_id
+        self.read_only = read_only
+        self.course_id = course_id
+        self.section_id = section_id
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._seen_at = {}
+        self._students = {}   # student_code -> (id, display name) | None
+        self.changes = Versioned()   # bumped whenever someone is marked present
+        q = Enrollment.query.filter_by(course_id=course_id)
+        if section_id:
+            q = q.filter_by(section_id=section_id)
+        self.roster = {e.student_id for e in q.all()}
+        self.marked = {a.student_id for a in Attendance.query.filter_by(session_id=session_id)}
+
+    def lookup(self, student_code):
+        with self._lock:
+            if student_code in self._students:
+                return self._students[student_code]
+        st = Student.query.filter_by(student_code=student_code).first()
+        found = (st.id, f"{st.name} ({st.student_code})") if st else None
+        with self._lock:
+            self._students[student_code] = found
+        return found
+
+    def _closed(self):
+        s = AttendanceSession.query.get(self.session_id)
+        return s is None or bool(s.closed) or SessionSummary.query.get(self.session_id) is not None
+
+    def mark(self, student_id):
+        """Returns True when this call recorded the student as present."""
+        if self.read_only:
+            return False
+        now = time.time()
+        with self._lock:
+            if student_id in self.marked or now - self._seen_at.get(student_id, 0.0) < self.cooldown:
+                return False
+            self._seen_at[student_id] = now
+            if student_id not in self.roster:
+                return False
+            self.marked.add(student_id)
+        if self._closed():   # closed (or archived) since this pipeline started
+            self.read_only = True
+            return False
+        try:
+            db.session.add(Attendance(session_id=self.session_id, student_id=student_id, status="present"))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()   # another camera/worker got there first
+            return False
+        self.changes.bump()
+        return True
+
+class FrameProcessor:
+    """
+    Detection + recognition for one frame. Not thread-safe (the cascade is not):
+    each worker borrows one from the shared pool. process() returns [((x,y,w,h), student_code | None, distance)].
+    """
+    def __init__(self, cfg, cascade, recog=None, label_map=None, metrics_key=None):
+        self.metrics_key = metrics_key
+        self.cascade = cascade
+        self.recog = recog
+        self.label_map = label_map or {}
+        self.scale = cfg.get("DETECTION_SCALE_FACTOR", 1.1)
+        self.neighbors = cfg.get("DETECTION_MIN_NEIGHBORS", 6)
+        self.size = tuple(cfg.get("CAPTURE_IMAGE_SIZE", (200,200)))
+        self.thr = recognition_threshold(recog)
+        self.batched = hasattr(recog, "predict_batch")
+
+    def detect(self, frame):
+        with metrics.timer(self.metrics_key, "preprocess"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray = cv2.equalizeHist(gray)
+        with metrics.timer(self.metrics_key, "detect"):
+            faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale, minNeighbors=self.neighbors, minSize=(70,70))
+        return gray, [tuple(int(v) for v in f) for f in faces]
+
+    def recognize(self, gray, faces):
+        matches = [(-1, 9999.0)] * len(faces)
+        if self.recog is None or not self.label_map or not faces:
+            return matches
+        with metrics.timer(self.metrics_key, "predict"):
+            crops = [cv2.resize(gray[y:y+h, x:x+w], self.size) for (x,y,w,h) in faces]
+            try:
+                if self.batched:
+                    labels, dists = self.recog.predict_batch(crops)   # one matmul for all faces
+                    return [(int(l), float(d)) for l, d in zip(labels, dists)]
+                return [self.recog.predict(c) for c in crops]          # LBPH distance
+            except Exception:
+                return matches
+
+    def process(self, frame):
+        gray, faces = self.detect(frame)
+        out = []
+        for box, (label, confidence) in zip(faces, self.recognize(gray, faces)):
+            code = self.label_map.get(label) if confidence <= self.thr else None
+            out.append((box, code, confidence))
+        return out
+
+class SourceWorker(threading.Thread):
+    def __init__(self, app, pipeline, name, spec):
+        super().__init__(name=f"session-{pipeline.session_id}-{name}", daemon=True)
+        self.app = app
+        self.pipeline = pipeline
+        self.cam_name = name
+        self.spec = spec
+        self.slot = FrameSlot()
+        self.meta = {}
+        self.opened = False
+        self.frames = 0
+        self.detected_frames = 0
+        self._halt = threading.Event()
+
+    def stop(self):
+        self._halt.set()
+
+    def run(self):
+        with self.app.app_context():
+            src = self._open()
+            if src is None:
+                return
+            try:
+                self._loop(src)
+            finally:
+                src.release()
+                db.session.remove()
+
+    def _open(self):
+        retry = self.app.config.get("CAMERA_RETRY_SECONDS", 5)
+        while not self._halt.is_set():
+            try:
+                src, self.meta = open_source(self.spec)
+            except ValueError as e:   # bad spec: retrying won't help
+                self.meta = {"errors": [str(e)]}
+                self.slot.publish(_error_frame("Bad camera source", str(e)), [])
+                return None
+            if src is not None:
+                self.opened = True
+                return src
+            msg = self.meta.get("errors", [""])[0] if isinstance(self.meta, dict) else ""
+            self.slot.publish(_error_frame("Camera not available", msg), [])
+            self._halt.wait(retry)
+        return None
+
+    def _loop(self, src):
+        marker = self.pipeline.marker
+        if marker is None:   # camera feed only: frames, no detection
+            return self._run(src, None)
+        try:
+            recog, label_map = load_session_recognizer(marker.course_id, marker.section_id)
+        except Exception as e:
+            self.app.logger.warning("session %s: no recognizer (%s)", self.pipeline.session_id, e)
+            recog, label_map = None, None
+        with borrow_cascade(self.app.config) as cascade:
+            self._run(src, FrameProcessor(self.app.config, cascade, recog, label_map,
+                                          metrics_key=self.pipeline.session_id))
+
+    def _run(self, src, processor):
+        marker = self.pipeline.marker
+        key = self.pipeline.session_id
+        detections = []
+
+        while not self._halt.is_set() and not self.pipeline.idle():
+            with metrics.timer(key, "read"):
+                ok, frame = src.read()
+            if not ok or frame is None:
+                self.slot.publish(_error_frame("Camera read() failed"), [])
+                self._halt.wait(0.1)
+                continue
+            self.frames += 1
+
+            if processor is not None and self.pipeline.scheduler.try_acquire(self.cam_name):
+                self.detected_frames += 1
+                detections = []
+                for (x,y,w,h), code, confidence in processor.process(frame):
+                    name, conf = "Unknown", None
+                    found = marker.lookup(code) if code else None
+                    if found:
+                        name, conf = found[1], confidence
+                        with metrics.timer(key, "mark"):
+                            marker.mark(found[0])
+                    detections.append((x, y, w, h, name, conf))
+            self.slot.publish(frame, detections)
+
+    def stats(self):
+        return {"name": self.cam_name, "spec": str(self.spec), "alive": self.is_alive(),
+                "frames": self.frames, "detected_frames": self.detected_frames, "meta": self.meta}
+
+class SessionPipeline:
+    def __init__(self, app, session_id, sources):
+        self.session_id = session_id
+        self.scheduler = DetectionScheduler(app.config.get("DETECTION_MAX_FPS"))
+        self.marker = None   # FEED: cameras only
+        if session_id != FEED:
+            sess = AttendanceSession.query.get(session_id)
+            self.marker = AttendanceMarker(session_id, sess.course_id, sess.section_id,
+                                           app.config.get("RECOGNITION_COOLDOWN_SECONDS", 8),
+                                           read_only=bool(sess.closed) or SessionSummary.query.get(session_id) is not None)
+        self.workers = {name: SourceWorker(app, self, name, spec) for name, spec in sources.items()}
+        self.idle_seconds = app.config.get("PIPELINE_IDLE_SECONDS", 30)
+        self._viewers = 0
+        self._idle_since = time.monotonic()
+        self._lock = threading.Lock()
+        for w in self.workers.values():
+            w.start()
+
+    def worker(self, name=None):
+        worker = self.workers.get(name) if name else None
+        return worker or next(iter(self.workers.values()))
+
+    def slot(self, name=None):
+        return self.worker(name).slot
+
+    def attach(self):
+        with self._lock:
+            self._viewers += 1
+
+    def detach(self):
+        with self._lock:
+            self._viewers -= 1
+            if self._viewers <= 0:
+                self._idle_since = time.monotonic()
+
+    def alive(self):
+        return any(w.is_alive() for w in self.workers.values())
+
+    def unwatched(self):
+        with self._lock:
+            return self._viewers <= 0
+
+    def idle(self):
+        with self._lock:
+            return self._viewers <= 0 and time.monotonic() - self._idle_since > self.idle_seconds
+
+    def stop(self):
+        for w in self.workers.values():
+            w.stop()
+
+    def stats(self):
+        return {"session_id": self.session_id, "viewers": self._viewers,
+                "marked": len(self.marker.marked) if self.marker else 0,
+                "roster": len(self.marker.roster) if self.marker else 0,
+                "cameras": [w.stats() for w in self.workers.values()]}
+
+def set_session_sources(session_id, names):
+    """Remember the cameras picked for a session in this process only (see _session_sources)."""
+    _session_sources[session_id] = list(names)
+
+def session_sources(app, session_id):
+    """{name: spec} of the cameras this session uses (all configured by default)."""
+    configured = camera_sources(app)
+    chosen = _session_sources.get(session_id) or list(configured)
+    return {n: configured[n] for n in chosen if n in configured} or configured
+
+def get_pipeline(app, session_id, sources=None):
+    """Running pipeline for a session, started on first use. Pipelines nobody has
+    watched for PIPELINE_IDLE_SECONDS are stopped here, so cameras get released;
+    so is an unwatched camera feed when a session needs the cameras."""
+    with _pipelines_lock:
+        for sid in [sid for sid, p in _pipelines.items() if sid != session_id and
+                    (p.idle() or (sid == FEED and session_id not in _pipelines and p.unwatched()))]:
+            _pipelines.pop(sid).stop()
+        p = _pipelines.get(session_id)
+        if p is not None and (p.idle() or not p.alive()):
+            p.stop()
+            p = None
+        if p is None:
+            p = _pipelines[session_id] = SessionPipeline(app, session_id, sources or session_sources(app, session_id))
+        return p
+
+def camera_feed(app, camera=None):
+    """
+    Pipeline whose worker reads `camera` (default: the first configured one):
+    a running session's, so the device is never opened twice, or else a
+    sessionless FEED that only publishes frames. Callers attach()/detach().
+    """
+    configured = camera_sources(app)
+    name = camera if camera in configured else next(iter(configured))
+    with _pipelines_lock:
+        for sid, p in sorted(_pipelines.items(), key=lambda kv: kv[0] == FEED):   # sessions first
+            w = p.workers.get(name)
+            if w is not None and w.is_alive() and not p.idle():
+                return p
+    return get_pipeline(app, FEED, {name: configured[name]})
+
+def find_pipeline(session_id):
+    """Running pipeline for a session, or None (never starts one)."""
+    with _pipelines_lock:
+        return _pipelines.get(session_id)
+
+def stop_pipeline(session_id):
+    with _pipelines_lock:
+        p = _pipelines.pop(session_id, None)
+    if p is not None:
+        p.stop()
+    _session_sources.pop(session_id, None)
+    metrics.reset(session_id)
+    return p is not None
+
+def pipelines_stats():
+    with _pipelines_lock:
+        return [p.stats() for p in _pipelines.values()]
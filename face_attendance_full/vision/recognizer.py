@@ -1,7 +1,9 @@
 # vision/recognizer.py
-import os, json, cv2
+import os, json, time, cv2
 import numpy as np
 from flask import current_app as app
+from . import metrics
+from .resources import RecognizerPool, shared_model
 
 def _prep(img: np.ndarray) -> np.ndarray:
     """Return a 2D uint8 C-contiguous face image of target size."""
@@ -18,8 +20,9 @@ def _prep(img: np.ndarray) -> np.ndarray:
         raise RuntimeError(f"Prepped image invalid (ndim={img.ndim}, dtype={img.dtype}, contiguous={img.flags['C_CONTIGUOUS']})")
     return img
 
-def _list_images(dataset_dir):
-    """Collect grayscale, prepped images + int32 labels + label_map."""
+def _list_images(dataset_dir, persons=None):
+    """Collect grayscale, prepped images + int32 labels + label_map.
+    `persons` restricts the set to those student codes."""
     images, labels = [], []
     label_map = {}     # numeric label -> student_code
     next_label = 0
@@ -27,7 +30,9 @@ def _list_images(dataset_dir):
     if not os.path.isdir(dataset_dir):
         return images, np.asarray([], dtype=np.int32), label_map
 
-    persons = sorted([p for p in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, p))])
+    only = set(persons) if persons is not None else None
+    persons = sorted([p for p in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, p))
+                      and (only is None or p in only)])
     for person in persons:
         pdir = os.path.join(dataset_dir, person)
         label_map[next_label] = person
@@ -116,6 +121,7 @@ def train_lbph_model():
     lbph_path   = app.config["LBPH_MODEL"]
     labels_path = app.config["LABELS_JSON"]
 
+    t0 = time.perf_counter()
     images, labels_np, label_map = _list_images(dataset_dir)
 
     # Diagnostics (stdout)
@@ -137,18 +143,178 @@ def train_lbph_model():
     with open(labels_path, "w", encoding="utf-8") as f:
         json.dump(label_map, f, ensure_ascii=False, indent=2)
 
+    metrics.observe("training", "train", time.perf_counter() - t0)
     print(f"[train] saved model: {lbph_path}")
     print(f"[train] saved labels: {labels_path}")
     return True
 
 def load_recognizer():
+    """(recognizer, {label: student_code}) for the configured RECOGNIZER_BACKEND."""
+    if app.config.get("RECOGNIZER_BACKEND", "lbph") == "embedding":
+        return load_embedding_model()
+    return load_lbph_model()
+
+def load_lbph_model():
+    """Shared per process; re-read only after the model files change."""
     lbph_path   = app.config["LBPH_MODEL"]
     labels_path = app.config["LABELS_JSON"]
     if not os.path.exists(lbph_path) or not os.path.exists(labels_path):
         return None, None
+    return shared_model((lbph_path, labels_path), lambda: _read_lbph(lbph_path, labels_path))
+
+def read_lbph(path):
     recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(lbph_path)
+    recognizer.read(path)
+    return recognizer
+
+def lbph_pool(path, first=None):
+    """RECOGNIZER_POOL_SIZE copies of the LBPH model at `path`, loaded as threads need them."""
+    return RecognizerPool(lambda: read_lbph(path), app.config.get("RECOGNIZER_POOL_SIZE", 4), first)
+
+def _read_lbph(lbph_path, labels_path):
     with open(labels_path, "r", encoding="utf-8") as f:
         label_map = json.load(f)  # {"0":"s1001", ...}
     inv = {int(k): v for k, v in label_map.items()}
-    return recognizer, inv
+    return lbph_pool(lbph_path, read_lbph(lbph_path)), inv
+
+# -------------------- EMBEDDING (PCA + LDA) BACKEND --------------------
+
+class EmbeddingRecognizer:
+    """
+    Fisherfaces-style recognizer: faces are downsampled, projected with PCA then
+    LDA to a few dimensions and L2-normalized. The gallery is one contiguous
+    float32 matrix, so matching a batch of faces is a single matrix multiply.
+    predict() returns (label, cosine distance) like LBPH's (label, distance).
+    """
+    def __init__(self, mean, projection, embeddings, labels, input_size):
+        self.mean = np.ascontiguousarray(mean, dtype=np.float32)
+        self.projection = np.ascontiguousarray(projection, dtype=np.float32)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        self.input_size = tuple(int(v) for v in input_size)
+
+    @staticmethod
+    def _normalize(x):
+        norms = np.linalg.norm(x, axis=1, keepdims=True)
+        return x / np.maximum(norms, 1e-6)
+
+    @classmethod
+    def _flatten(cls, faces, input_size):
+        return np.stack([
+            cv2.resize(f, input_size, interpolation=cv2.INTER_AREA).ravel() for f in faces
+        ]).astype(np.float32) / 255.0
+
+    @classmethod
+    def fit(cls, images, labels_np, input_size=(64, 64), dims=32):
+        x = cls._flatten(images, input_size)
+        mean = x.mean(axis=0)
+        x -= mean
+        classes = np.unique(labels_np)
+        n, c = x.shape[0], len(classes)
+
+        # PCA to at most n - c dims, so the within-class scatter is invertible for LDA
+        _, sv, vt = np.linalg.svd(x, full_matrices=False)
+        keep = sv > sv[0] * 1e-6 if len(sv) else sv.astype(bool)
+        pca_dims = max(1, min(int(keep.sum()), n - c if n > c else n))
+        pca = vt[:pca_dims].T                                   # (D, p)
+        y = x @ pca
+
+        if c >= 3 and pca_dims >= 2:
+            # LDA: maximize between-class over within-class scatter (whitened eigh)
+            mu = y.mean(axis=0)
+            sw = np.zeros((pca_dims, pca_dims), dtype=np.float64)
+            sb = np.zeros_like(sw)
+            for k in classes:
+                yk = y[labels_np == k]
+                dk = yk - yk.mean(axis=0)
+                sw += dk.T @ dk
+                m = (yk.mean(axis=0) - mu)[:, None]
+                sb += len(yk) * (m @ m.T)
+            sw += np.eye(pca_dims) * (np.trace(sw) / pca_dims * 1e-3 + 1e-9)
+            chol = np.linalg.cholesky(sw)
+            inv = np.linalg.inv(chol)
+            evals, evecs = np.linalg.eigh(inv @ sb @ inv.T)
+            order = np.argsort(evals)[::-1][:min(c - 1, dims)]
+            projection = pca @ (inv.T @ evecs[:, order])
+        else:
+            # fewer than 3 people: LDA would give <= 1 dimension; keep leading PCA axes
+            projection = pca[:, :dims]
+
+        embeddings = cls._normalize(x @ projection)
+        return cls(mean, projection, embeddings, labels_np, input_size)
+
+    def embed(self, faces):
+        x = self._flatten(faces, self.input_size) - self.mean
+        return self._normalize(x @ self.projection)
+
+    def predict_batch(self, faces):
+        """Nearest gallery sample for each face: (labels, cosine distances)."""
+        if not len(faces) or not len(self.labels):
+            return np.empty(0, np.int32), np.empty(0, np.float32)
+        sims = self.embed(faces) @ self.embeddings.T            # (M, N)
+        best = sims.argmax(axis=1)
+        return self.labels[best], 1.0 - sims[np.arange(len(best)), best]
+
+    def predict(self, face):
+        labels, dists = self.predict_batch([face])
+        if not len(labels):
+            return -1, 9999.0
+        return int(labels[0]), float(dists[0])
+
+    def subset(self, keep_labels):
+        """Recognizer restricted to some labels (shares the projection)."""
+        mask = np.isin(self.labels, list(keep_labels))
+        return EmbeddingRecognizer(self.mean, self.projection, self.embeddings[mask], self.labels[mask], self.input_size)
+
+    def centroids(self):
+        """{label: normalized mean embedding} - one vector per person."""
+        return {int(k): self._normalize(self.embeddings[self.labels == k].mean(axis=0, keepdims=True))[0]
+                for k in np.unique(self.labels)}
+
+    def save(self, path, label_map):
+        np.savez_compressed(path, mean=self.mean, projection=self.projection, embeddings=self.embeddings,
+                            labels=self.labels, input_size=np.asarray(self.input_size),
+                            label_map=np.asarray(json.dumps(label_map)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            rec = cls(data["mean"], data["projection"], data["embeddings"], data["labels"], data["input_size"])
+            label_map = {int(k): v for k, v in json.loads(str(data["label_map"])).items()}
+        return rec, label_map
+
+def train_embedding_model():
+    dataset_dir = app.config["DATASET_DIR"]
+    model_path  = app.config["EMBEDDING_MODEL"]
+
+    t0 = time.perf_counter()
+    images, labels_np, label_map = _list_images(dataset_dir)
+    print(f"[train] persons={len(label_map)}, images={len(images)} (embedding)")
+    _validate_training_set(images, labels_np)
+
+    recognizer = EmbeddingRecognizer.fit(images, labels_np,
+                                         input_size=tuple(app.config.get("EMBEDDING_INPUT_SIZE", (64, 64))),
+                                         dims=app.config.get("EMBEDDING_DIMS", 32))
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    recognizer.save(model_path, label_map)
+    metrics.observe("training", "train", time.perf_counter() - t0)
+    print(f"[train] saved embedding model: {model_path} dims={recognizer.projection.shape[1]}")
+    return True
+
+def load_embedding_model():
+    model_path = app.config["EMBEDDING_MODEL"]
+    if not os.path.exists(model_path):
+        return None, None
+    return shared_model((model_path,), lambda: EmbeddingRecognizer.load(model_path))
+
+def train_recognizer():
+    """Train the configured RECOGNIZER_BACKEND."""
+    if app.config.get("RECOGNIZER_BACKEND", "lbph") == "embedding":
+        return train_embedding_model()
+    return train_lbph_model()
+
+def recognition_threshold(recognizer):
+    """Accept threshold in the recognizer's own distance units (lower is better)."""
+    if isinstance(recognizer, EmbeddingRecognizer):
+        return app.config.get("EMBEDDING_DISTANCE_THRESHOLD", 0.35)
+    return app.config.get("RECOGNITION_CONFIDENCE_THRESHOLD", 95)
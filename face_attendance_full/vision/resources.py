@@ -0,0 +1,182 @@
+# vision/resources.py
+# OpenCV-backed resources shared by every request, stream and capture in the
+# process. Nothing here (or in the web layer) imports cv2 at module import time;
+# the first vision call, or warm_up(), pays for it.
+#
+# - Haar cascades come from a small pool per XML path: detectMultiScale isn't
+#   safe to call concurrently on one instance, so callers borrow one for the
+#   duration of their work and give it back (the XML is parsed once per
+#   concurrently-used instance, not per request).
+# - Trained models (LBPH .yml, embedding .npz, session galleries) are read once
+#   and shared until the files change on disk (mtime/size), so retraining is
+#   picked up by the next session without a restart. LBPH predict isn't
+#   thread-safe either, so LBPH models are a small RecognizerPool of copies.
+# Anything loaded by warm_up() before a server forks its workers is inherited
+# copy-on-write.
+import os, time, threading
+from contextlib import contextmanager
+
+def haar_cascade_path(config):
+    """HAAR_CASCADE, or OpenCV's bundled frontal-face cascade when unset."""
+    path = config.get("HAAR_CASCADE")
+    if path:
+        return path
+    import cv2
+    return cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+# -------------------- CASCADES --------------------
+
+class CascadePool:
+    def __init__(self, path):
+        self.path = path
+        self.created = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def _create(self):
+        import cv2
+        cascade = cv2.CascadeClassifier(self.path)
+        if cascade.empty():
+            raise RuntimeError(f"Could not load Haar cascade: {self.path}")
+        with self._lock:
+            self.created += 1
+        return cascade
+
+    def preload(self, n=1):
+        while len(self._free) < n:
+            c = self._create()
+            with self._lock:
+                self._free.append(c)
+
+    @contextmanager
+    def borrow(self):
+        with self._lock:
+            cascade = self._free.pop() if self._free else None
+        if cascade is None:
+            cascade = self._create()
+        try:
+            yield cascade
+        finally:
+            with self._lock:
+                self._free.append(cascade)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def cascade_pool(config):
+    path = haar_cascade_path(config)
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(path, CascadePool(path))
+    return pool
+
+def borrow_cascade(config):
+    """`with borrow_cascade(app.config) as cascade:` -- exclusive use of a shared cascade."""
+    return cascade_pool(config).borrow()
+
+# -------------------- MODELS --------------------
+
+class RecognizerPool:
+    """
+    Up to `size` copies of one trained cv2.face recognizer, each used by one
+    thread at a time: predict() borrows a free copy (loading another while
+    fewer than `size` exist) and waits only when all are busy. Cached by
+    shared_model() like any other model, so retraining replaces the whole pool.
+    """
+    def __init__(self, load, size=4, first=None):
+        self._load = load
+        self.size = max(1, int(size))
+        self._free = [first] if first is not None else []
+        self.created = len(self._free)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def borrow(self):
+        with self._cond:
+            while not self._free and self.created >= self.size:
+                self._cond.wait()
+            recognizer = self._free.pop() if self._free else None
+            if recognizer is None:
+                self.created += 1
+        if recognizer is None:
+            try:
+                recognizer = self._load()
+            except BaseException:
+                with self._cond:
+                    self.created -= 1
+                    self._cond.notify()
+                raise
+        try:
+            yield recognizer
+        finally:
+            with self._cond:
+                self._free.append(recognizer)
+                self._cond.notify()
+
+    def predict(self, img):
+        with self.borrow() as recognizer:
+            return recognizer.predict(img)
+
+_models = {}            # paths -> (signature, value)
+_models_lock = threading.Lock()
+
+def _signature(paths):
+    sig = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None
+        sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+def shared_model(paths, loader):
+    """
+    loader() once per process for these files, then the cached result until any
+    of them changes on disk. Missing files aren't cached (loader decides what to
+    return for them).
+    """
+    key = tuple(paths)
+    sig = _signature(key)
+    if sig is None:
+        return loader()
+    hit = _models.get(key)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    with _models_lock:
+        hit = _models.get(key)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        value = loader()
+        _models[key] = (sig, value)
+        return value
+
+def stats():
+    return {"cascades": {p: {"created": pool.created, "idle": len(pool._free)} for p, pool in _pools.items()},
+            "models": [os.path.basename(k[0]) for k in _models]}
+
+# -------------------- WARM-UP --------------------
+
+def warm_up(app):
+    """
+    Load OpenCV, parse the cascade and read the recognizer once, so the first
+    request doesn't pay for it. Call from `flask warm-up`, before app.run(), or
+    in the server's master before it forks (VISION_PRELOAD); returns timings in ms.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    import cv2
+    timings["import_cv2"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        cascade_pool(app.config).preload(app.config.get("CASCADE_POOL_PRELOAD", 2))
+        timings["cascade"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        t0 = time.perf_counter()
+        from .recognizer import load_recognizer
+        from . import stream, capture, dataset   # import the rest of the subsystem too
+        load_recognizer()
+        timings["recognizer"] = round((time.perf_counter() - t0) * 1000, 1)
+    return timings
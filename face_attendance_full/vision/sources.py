@@ -0,0 +1,273 @@
+# vision/sources.py
+# Frame sources. Everything that feeds frames into the pipeline exposes the same
+# small cv2.VideoCapture-like interface (read() -> (ok, frame), isOpened(), release()),
+# so the stream and capture code can run from a camera, a recording or synthetic
+# frames without knowing which.
+#
+# Source specs (CAMERA_SOURCE or open_source(spec)):
+#   0, "0", "device:1"                         local camera (probed/cached, see camera.py)
+#   "rtsp://...", "http://..."                 network stream
+#   "file:/path/clip.mp4?fps=max&loop=1"       video replay (fps=<n> | native | max)
+#   "synthetic:?faces=2&fps=30&size=1280x720"  dataset faces composited on backgrounds
+import os, time
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit, parse_qs
+import cv2, numpy as np
+
+class FrameSource(ABC):
+    kind = "source"
+
+    @abstractmethod
+    def read(self):
+        """(ok, frame), like cv2.VideoCapture.read()."""
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+    def describe(self):
+        return {"kind": self.kind}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class _Pacer:
+    """Sleep so that successive tick() calls are at most `fps` per second."""
+    def __init__(self, fps=None):
+        self.interval = 1.0 / fps if fps else 0.0
+        self.next_at = time.perf_counter()
+
+    def tick(self):
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        # don't try to "catch up" after a stall
+        self.next_at = max(self.next_at + self.interval, now)
+
+class CaptureSource(FrameSource):
+    """Wraps an opened cv2.VideoCapture."""
+    kind = "device"
+
+    def __init__(self, cam, meta=None):
+        self.cam = cam
+        self.meta = meta or {}
+
+    def read(self):
+        return self.cam.read()
+
+    def isOpened(self):
+        return self.cam is not None and self.cam.isOpened()
+
+    def release(self):
+        if self.cam is not None:
+            self.cam.release()
+            self.cam = None
+
+    def describe(self):
+        return dict(self.meta, kind=self.kind)
+
+class UrlSource(CaptureSource):
+    """RTSP/HTTP stream; reconnects after repeated read failures."""
+    kind = "url"
+
+    def __init__(self, url, reconnect_after=30):
+        self.url = url
+        self.reconnect_after = reconnect_after
+        self._failures = 0
+        super().__init__(cv2.VideoCapture(url), {"url": url})
+
+    def read(self):
+        ok, frame = self.cam.read() if self.cam is not None else (False, None)
+        if ok and frame is not None:
+            self._failures = 0
+            return ok, frame
+        self._failures += 1
+        if self._failures >= self.reconnect_after:
+            self._failures = 0
+            if self.cam is not None:
+                self.cam.release()
+            self.cam = cv2.VideoCapture(self.url)
+        return False, None
+
+class FileReplaySource(FrameSource):
+    """
+    Replays a video file. fps="native" paces at the file's own rate, a number
+    paces at that rate and "max" (or None) reads as fast as decoding allows.
+    """
+    kind = "file"
+
+    def __init__(self, path, fps="native", loop=True):
+        self.path = path
+        self.loop = loop
+        self.cam = cv2.VideoCapture(path)
+        if fps == "native":
+            native = self.cam.get(cv2.CAP_PROP_FPS) if self.cam.isOpened() else 0
+            fps = native if native and native > 0 else None
+        elif fps in (None, "max"):
+            fps = None
+        else:
+            fps = float(fps)
+        self.fps = fps
+        self._pacer = _Pacer(fps)
+        self.frames = 0
+
+    def read(self):
+        if self.cam is None:
+            return False, None
+        self._pacer.tick()
+        ok, frame = self.cam.read()
+        if (not ok or frame is None) and self.loop:
+            self.cam.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cam.read()
+        if ok:
+            self.frames += 1
+        return ok, frame
+
+    def isOpened(self):
+        return self.cam is not None and self.cam.isOpened()
+
+    def release(self):
+        if self.cam is not None:
+            self.cam.release()
+            self.cam = None
+
+    def describe(self):
+        return {"kind": self.kind, "path": self.path, "fps": self.fps or "max", "loop": self.loop, "frames": self.frames}
+
+def _load_dataset_faces(dataset_dir, per_person=3):
+    faces = []
+    if not dataset_dir or not os.path.isdir(dataset_dir):
+        return faces
+    for person in sorted(os.listdir(dataset_dir)):
+        pdir = os.path.join(dataset_dir, person)
+        if not os.path.isdir(pdir):
+            continue
+        names = sorted(f for f in os.listdir(pdir) if f.lower().endswith((".png", ".jpg", ".jpeg")))
+        for fname in names[:per_person]:
+            img = cv2.imread(os.path.join(pdir, fname), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                faces.append((person, img))
+    return faces
+
+class SyntheticSource(FrameSource):
+    """
+    Deterministic synthetic classroom: dataset faces (padded so the Haar cascade
+    has some context) composited at jittered positions onto generated backgrounds.
+    `truth` holds the student codes and boxes placed in the last frame.
+    """
+    kind = "synthetic"
+
+    def __init__(self, dataset_dir, size=(1280, 720), faces=2, fps=None, seed=0,
+                 face_px=(160, 260), backgrounds=4):
+        self.width, self.height = int(size[0]), int(size[1])
+        self.n_faces = int(faces)
+        self.fps = fps
+        self.seed = seed
+        self.face_px = face_px
+        self._rng = np.random.default_rng(seed)
+        self._pacer = _Pacer(fps)
+        self._faces = _load_dataset_faces(dataset_dir)
+        self._backgrounds = [self._background() for _ in range(backgrounds)]
+        self.frames = 0
+        self.truth = []
+
+    def _background(self):
+        h, w = self.height, self.width
+        ramp = np.linspace(self._rng.integers(30, 90), self._rng.integers(120, 200), w, dtype=np.float32)
+        bg = np.repeat(ramp[None, :], h, axis=0)
+        bg += self._rng.normal(0, 8, size=(h, w)).astype(np.float32)
+        bg = np.clip(bg, 0, 255).astype(np.uint8)
+        bg = cv2.cvtColor(bg, cv2.COLOR_GRAY2BGR)
+        for _ in range(6):
+            x, y = int(self._rng.integers(0, w)), int(self._rng.integers(0, h))
+            color = tuple(int(c) for c in self._rng.integers(0, 255, 3))
+            cv2.rectangle(bg, (x, y), (x + int(self._rng.integers(40, 300)), y + int(self._rng.integers(40, 200))), color, -1)
+        return bg
+
+    def read(self):
+        self._pacer.tick()
+        frame = self._backgrounds[self.frames % len(self._backgrounds)].copy()
+        self.truth = []
+        if self._faces and self.n_faces:
+            slot_w = self.width // self.n_faces
+            for i in range(self.n_faces):
+                code, face = self._faces[int(self._rng.integers(len(self._faces)))]
+                px = int(self._rng.integers(self.face_px[0], self.face_px[1] + 1))
+                px = min(px, slot_w - 10, self.height - 10)
+                pad = px // 4
+                inner = max(px - 2 * pad, 16)
+                tile = cv2.resize(face, (inner, inner))
+                tile = cv2.copyMakeBorder(tile, pad, pad, pad, pad, cv2.BORDER_REPLICATE)
+                th, tw = tile.shape[:2]
+                x = i * slot_w + int(self._rng.integers(0, max(1, slot_w - tw)))
+                y = int(self._rng.integers(0, max(1, self.height - th)))
+                frame[y:y+th, x:x+tw] = cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
+                self.truth.append({"student_code": code, "box": [x + pad, y + pad, inner, inner]})
+        self.frames += 1
+        return True, frame
+
+    def describe(self):
+        return {"kind": self.kind, "size": [self.width, self.height], "faces": self.n_faces,
+                "fps": self.fps or "max", "seed": self.seed, "dataset_faces": len(self._faces), "frames": self.frames}
+
+def _query(spec):
+    parts = urlsplit(spec)
+    return {k: v[-1] for k, v in parse_qs(parts.query).items()}, parts
+
+def _rate(value, default=None):
+    if value in (None, ""):
+        return default
+    if value in ("max", "native"):
+        return value
+    return float(value)
+
+def open_source(spec=None, dataset_dir=None):
+    """
+    Open a frame source from a spec (defaults to CAMERA_SOURCE). Returns
+    (source | None, meta), mirroring camera.open_camera().
+    """
+    from flask import current_app
+    if spec is None:
+        spec = current_app.config.get("CAMERA_SOURCE", 0)
+    if dataset_dir is None:
+        dataset_dir = current_app.config.get("DATASET_DIR")
+    if isinstance(spec, str) and spec.strip().isdigit():
+        spec = int(spec)
+
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.startswith("device")):
+        from .camera import open_camera
+        index = spec if isinstance(spec, int) else spec.partition(":")[2].strip()
+        if not str(index).isdigit():
+            raise ValueError(f"camera index missing or invalid in source spec {spec!r} (use device:<n>)")
+        cam, meta = open_camera(int(index))
+        return (CaptureSource(cam, meta), meta) if cam is not None else (None, meta)
+
+    if spec.startswith("synthetic"):
+        q, _ = _query(spec)
+        size = tuple(int(v) for v in q.get("size", "1280x720").lower().split("x"))
+        fps = _rate(q.get("fps"))
+        src = SyntheticSource(dataset_dir, size=size, faces=int(q.get("faces", 2)),
+                              fps=None if fps == "max" else fps, seed=int(q.get("seed", 0)))
+        return src, src.describe()
+
+    if spec.startswith("file:") or os.path.isfile(spec):
+        q, parts = _query(spec)
+        path = parts.path if spec.startswith("file:") else spec
+        src = FileReplaySource(path, fps=_rate(q.get("fps"), "native"), loop=q.get("loop", "1") not in ("0", "false"))
+        if not src.isOpened():
+            return None, {"errors": [f"file not opened: {path}"]}
+        return src, src.describe()
+
+    src = UrlSource(spec)
+    if not src.isOpened():
+        src.release()
+        return None, {"errors": [f"url not opened: {spec}"]}
+    return src, src.describe()
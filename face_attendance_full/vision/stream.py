@@ -1,163 +1,180 @@
-import time, cv2, platform, numpy as np
-from collections import defaultdict
+import time, asyncio, cv2
 from flask import current_app, request
-from models import db, Student, Enrollment, Attendance, AttendanceSession
-from .recognizer import load_recognizer
-
-_last_mark = defaultdict(float)
-
-def _cfg(key, default=None):
-    try:
-        return current_app.config.get(key, default)
-    except Exception:
-        return default
-
-def _open_camera():
-    import itertools
-    errors = []
-    src = _cfg("CAMERA_SOURCE", 0)
-    backends = _cfg("CAMERA_BACKENDS", [cv2.CAP_MSMF, cv2.CAP_DSHOW, cv2.CAP_ANY])
-    indices  = _cfg("CAMERA_INDICES", [0, 1, 2, 3])
-
-    # 1) URL string
-    if isinstance(src, str) and src.strip():
-        try:
-            cam = cv2.VideoCapture(src)
-            if cam is not None and cam.isOpened():
-                cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-                cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-                return cam, {"url": src}
-            if cam is not None:
-                cam.release()
-            errors.append(f"url not opened: {src}")
-        except Exception as e:
-            errors.append(f"url error: {e}")
-
-    # Build index order: try the configured source first (if int), then the rest
-    try_indices = []
-    if isinstance(src, int):
-        try_indices.append(src)
-    for i in indices:
-        if i not in try_indices:
-            try_indices.append(i)
-
-    # 2) Try (backend, index)
-    for be, idx in itertools.product(backends, try_indices):
-        try:
-            cam = cv2.VideoCapture(idx, be)
-            if cam is not None and cam.isOpened():
-                cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-                cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-                return cam, {"index": idx, "backend": int(be)}
-            if cam is not None:
-                cam.release()
-            errors.append(f"index={idx} backend={int(be)} not opened")
-        except Exception as e:
-            errors.append(f"index={idx} backend={int(be)} error={e}")
-
-    # 3) FINAL FALLBACK: plain VideoCapture(index) WITHOUT backend
-    for idx in try_indices:
+from models import db
+from .pipeline import get_pipeline
+from . import metrics
+
+def _annotate(frame, detections, debug=False, scale=1.0):
+    for (x, y, w, h, name, conf) in detections:
+        x, y, w, h = (int(v * scale) for v in (x, y, w, h))
+        color = (0,255,0) if name != "Unknown" else (0,0,255)
+        cv2.rectangle(frame, (x,y), (x+w,y+h), color, 2)
+        label_text = f"{name}" + (f"  conf:{conf:.1f}" if (debug and conf is not None) else "")
+        cv2.putText(frame, label_text, (x, y-8), cv2.FONT_HERSHEY_SIMPLEX, 0.6 if scale >= 0.5 else 0.4, color, 2 if scale >= 0.5 else 1)
+    return frame
+
+def _viewer_options():
+    """Per-viewer encoding options from the query string, bounded by config.
+    ?preview=1 selects the STREAM_PREVIEW preset (dashboard thumbnails)."""
+    cfg = current_app.config
+    opts = {"quality": cfg.get("STREAM_JPEG_QUALITY", 80),
+            "width": cfg.get("STREAM_MAX_WIDTH"),
+            "fps": cfg.get("STREAM_MAX_FPS", 15)}
+    if request.args.get("preview") in ("1","true","yes"):
+        opts.update(cfg.get("STREAM_PREVIEW", {}))
+    for key, cast in (("quality", int), ("width", int), ("fps", float)):
         try:
-            cam = cv2.VideoCapture(idx)
-            if cam is not None and cam.isOpened():
-                cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-                cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-                return cam, {"index": idx, "backend": "auto"}
-            if cam is not None:
-                cam.release()
-            errors.append(f"index={idx} (no backend) not opened")
-        except Exception as e:
-            errors.append(f"index={idx} (no backend) error={e}")
-
-    return None, {
-        "errors": errors,
-        "hint": "Try adjusting CAMERA_SOURCE/CAMERA_INDICES (0/1/2/3) and camera privacy settings; close apps using the camera."
-    }
-
-def camera_diagnostics():
-    cam, meta = _open_camera()
-    if cam is None:
-        return {"ok": False, "meta": meta, "platform": platform.platform()}
-    ret, frame = cam.read()
-    cam.release()
-    if not ret or frame is None:
-        return {"ok": False, "meta": {"error": "read() failed"}, "platform": platform.platform()}
-    return {"ok": True, "meta": meta, "platform": platform.platform(), "shape": [int(frame.shape[1]), int(frame.shape[0])]}
-
-def gen_frames_for_session(session_id:int):
-    cam, meta = _open_camera()
-    if cam is None:
-        # stream error frames so the <img> doesn't hang
+            value = cast(request.args[key]) if request.args.get(key) else None
+        except ValueError:
+            value = None
+        if value is not None and value > 0:   # non-positive values are ignored
+            opts[key] = value
+    opts["quality"] = min(max(opts["quality"], 10), cfg.get("STREAM_JPEG_QUALITY", 80), 95)
+    if opts["width"]:
+        # frames narrower than this are sent as-is (_encode only downscales)
+        width = max(opts["width"], 64)
+        opts["width"] = min(width, cfg.get("STREAM_MAX_WIDTH") or width)
+    if opts["fps"]:
+        opts["fps"] = min(opts["fps"], cfg.get("STREAM_MAX_FPS", 15) or opts["fps"])
+    return opts
+
+def _signature(frame):
+    """Tiny grayscale thumbnail used to tell whether a frame changed visibly."""
+    small = cv2.resize(frame, (32, 18), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype("int16")
+
+def _overlay_metrics(frame, key):
+    """Per-stage p50/p95 (ms) of this session, drawn top-left (?debug=1)."""
+    stages = metrics.snapshot(key).get(str(key), {})
+    y = 20
+    for stage in metrics.STAGES:
+        m = stages.get(stage)
+        if not m or "p50_ms" not in m:
+            continue
+        text = f"{stage:<10} p50 {m['p50_ms']:7.1f}  p95 {m['p95_ms']:7.1f} ms"
+        cv2.putText(frame, text, (10, y), cv2.FONT_HERSHEY_PLAIN, 1.0, (0,0,0), 3)
+        cv2.putText(frame, text, (10, y), cv2.FONT_HERSHEY_PLAIN, 1.0, (255,255,255), 1)
+        y += 16
+    return frame
+
+def _encode(frame, detections, debug, width, quality, metrics_key=None):
+    scale = 1.0
+    if width and frame.shape[1] > width:
+        scale = width / frame.shape[1]
+        frame = cv2.resize(frame, (width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    else:
+        frame = frame.copy()
+    frame = _annotate(frame, detections, debug, scale)
+    if debug and metrics.enabled():
+        frame = _overlay_metrics(frame, metrics_key)
+    with metrics.timer(metrics_key, "encode"):
+        ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+def _part(jpeg):
+    return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+class Viewer:
+    """
+    Per-connection stream state, shared by the threaded and the asyncio
+    streamers: JPEG quality, downscaled width and a frame-rate cap. Frames that
+    did not visibly change (and whose detections are the same) are not
+    re-encoded or re-sent, except for a keep-alive every STREAM_KEEPALIVE_SECONDS.
+    """
+    def __init__(self, session_id, cfg, opts, debug=False):
+        self.session_id = session_id
+        self.opts = opts
+        self.debug = debug
+        self.interval = 1.0 / opts["fps"] if opts["fps"] else 0.0
+        self.threshold = cfg.get("STREAM_CHANGE_THRESHOLD", 2.0)
+        self.keepalive = cfg.get("STREAM_KEEPALIVE_SECONDS", 2.0)
+        self.cache_key = (opts["width"], opts["quality"], debug)
+        self.seq = 0
+        self._last_sig, self._last_dets, self._sent_at = None, None, 0.0
+
+    @classmethod
+    def from_request(cls, session_id):
+        return cls(session_id, current_app.config, _viewer_options(),
+                   request.args.get("debug") in ("1","true","yes"))
+
+    def delay(self):
+        """Seconds to wait before taking the next frame (frame-rate cap)."""
+        return self._sent_at + self.interval - time.monotonic() if self.interval else 0.0
+
+    def wants(self, slot, seq, frame, detections):
+        """Take frame `seq`; True if it should be sent to this viewer."""
+        self.seq = seq
+        if frame is None:
+            return False
+        now = time.monotonic()
+        sig = slot.encoded(seq, "signature", lambda: _signature(frame))
+        if (self._last_sig is not None and detections == self._last_dets and now - self._sent_at < self.keepalive
+                and float(abs(sig - self._last_sig).mean()) < self.threshold):
+            return False
+        self._last_sig, self._last_dets, self._sent_at = sig, detections, now
+        return True
+
+    def render(self, slot, frame, detections):
+        """Multipart chunk for the frame accepted by wants(); encoded once per settings for all viewers."""
+        jpeg = slot.encoded(self.seq, self.cache_key, lambda: _encode(
+            frame, detections, self.debug, self.opts["width"], self.opts["quality"], self.session_id))
+        return _part(jpeg)
+
+def gen_frames_for_session(session_id:int, camera=None):
+    """
+    MJPEG generator for one camera of a session. Capture, detection and marking
+    run in the session's pipeline workers; this only encodes the latest frame,
+    so a slow viewer skips frames instead of slowing the session down.
+    Holds a server thread for as long as the viewer stays connected; see
+    agen_frames_for_session (asgi.py) for the threadless variant.
+    The server only notices a closed connection when it writes, so while no
+    new frame arrives the last part is re-sent every second.
+    """
+    viewer = Viewer.from_request(session_id)
+    pipeline = get_pipeline(current_app._get_current_object(), session_id)
+    db.session.remove()   # don't hold a pooled DB connection for as long as the viewer stays
+    slot = pipeline.slot(camera)
+    pipeline.attach()
+    last = b"\r\n"   # multipart preamble until the first frame: ignored by clients
+    try:
         while True:
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(frame, "Camera not available", (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 3)
-            msg = meta.get("errors", [""])[0] if isinstance(meta, dict) else ""
-            if msg:
-                cv2.putText(frame, msg[:48], (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,0), 2)
-            ret, buffer = cv2.imencode(".jpg", frame)
-            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n")
-            time.sleep(0.5)
-
-    face_cascade_path = _cfg("HAAR_CASCADE")
-    face_cascade = cv2.CascadeClassifier(face_cascade_path)
-
-    recog, label_map = load_recognizer()
-    scale = _cfg("DETECTION_SCALE_FACTOR", 1.1)
-    neighbors = _cfg("DETECTION_MIN_NEIGHBORS", 6)
-    size = tuple(_cfg("CAPTURE_IMAGE_SIZE", (200,200)))
-    thr = _cfg("RECOGNITION_CONFIDENCE_THRESHOLD", 95)
-    cooldown = _cfg("RECOGNITION_COOLDOWN_SECONDS", 8)
-
-    debug = request.args.get("debug") in ("1","true","yes")
-
-    while True:
-        ok, frame = cam.read()
-        if not ok or frame is None:
-            frame = np.zeros((480,640,3), dtype=np.uint8)
-            cv2.putText(frame, "Camera read() failed", (40,80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,255), 2)
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=scale, minNeighbors=neighbors, minSize=(70,70))
-
-        for (x,y,w,h) in faces:
-            face = cv2.resize(gray[y:y+h, x:x+w], size)
-
-            name = "Unknown"
-            conf_txt = ""
-
-            if recog is not None and label_map:
-                try:
-                    label, confidence = recog.predict(face)  # LBPH distance
-                except Exception:
-                    label, confidence = (-1, 9999.0)
-
-                if (label in label_map) and (confidence <= thr):
-                    student_code = label_map[label]
-                    student = Student.query.filter_by(student_code=student_code).first()
-                    if student:
-                        name = f"{student.name} ({student.student_code})"
-                        conf_txt = f"{confidence:.1f}"
-                        now = time.time()
-                        if now - _last_mark[student.id] > cooldown:
-                            sess = AttendanceSession.query.get(session_id)
-                            if sess:
-                                enrolled = Enrollment.query.filter_by(
-                                    student_id=student.id,
-                                    course_id=sess.course_id,
-                                    section_id=sess.section_id
-                                ).first()
-                                if enrolled:
-                                    if not Attendance.query.filter_by(session_id=session_id, student_id=student.id).first():
-                                        db.session.add(Attendance(session_id=session_id, student_id=student.id, status="present"))
-                                        db.session.commit()
-                                    _last_mark[student.id] = now
-
-            color = (0,255,0) if name != "Unknown" else (0,0,255)
-            cv2.rectangle(frame, (x,y), (x+w,y+h), color, 2)
-            label_text = f"{name}" + (f"  conf:{conf_txt}" if (debug and conf_txt) else "")
-            cv2.putText(frame, label_text, (x, y-8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-        ret, buffer = cv2.imencode(".jpg", frame)
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n")
+            delay = viewer.delay()
+            if delay > 0:
+                # frame-rate cap: wait, then take whatever is newest (older frames are dropped)
+                time.sleep(delay)
+            seq, frame, detections = slot.wait(viewer.seq, timeout=1.0)
+            if seq == viewer.seq:
+                if not pipeline.alive():
+                    return
+                yield last   # keep-alive: a gone viewer fails this write and ends the generator
+                continue
+            if viewer.wants(slot, seq, frame, detections):
+                last = viewer.render(slot, frame, detections)
+                yield last
+    finally:
+        pipeline.detach()
+
+async def agen_frames_for_session(pipeline, viewer, camera=None):
+    """
+    gen_frames_for_session for asyncio servers. Waiting for frames parks no
+    thread; the (shared) JPEG encode runs in the loop's default executor.
+    The caller starts the pipeline (get_pipeline needs an app context) and
+    cancels this generator when the viewer disconnects (asgi._stream).
+    """
+    loop = asyncio.get_running_loop()
+    slot = pipeline.slot(camera)
+    pipeline.attach()
+    try:
+        while True:
+            delay = viewer.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            seq, frame, detections = await slot.wait_async(viewer.seq, timeout=1.0)
+            if seq == viewer.seq:
+                if not pipeline.alive():
+                    return
+                continue
+            if viewer.wants(slot, seq, frame, detections):
+                yield await loop.run_in_executor(None, viewer.render, slot, frame, detections)
+    finally:
+        pipeline.detach()